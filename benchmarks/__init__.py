@@ -0,0 +1,4 @@
+"""
+Пакет со скриптами для замеров производительности на локальной базе данных
+PostgreSQL. Скрипты работают в отдельной схеме и не трогают таблицы бота.
+"""
@@ -1,19 +1,16 @@
 import asyncio
 import logging
 
-import asyncpg
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.filters import Command
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types.message import ContentType
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from asyncpg import Connection
 from asyncpg.pool import Pool
 
-import database.models
 from config_data import Config, load_config
-from database import TodayRemindersClass
-from database.database import Base, engine
+from database import UserLimitsCacheClass, apply_migrations, connect, create_pool
 from handlers import (
     adding_new_reminder,
     edit_list_reminders,
@@ -27,10 +24,16 @@ from middlewares import (
     DataBaseMiddleware,
     ProviderTokenMiddleware,
     SchedulerMiddleware,
-    TodayRemindersMiddleware,
+    UserLimitsMiddleware,
 )
 from middlewares.reminders_limits import RemindersLimits
-from services import plan_cron_save_today_reminders, plan_date_save_today_reminders
+from services import (
+    UserLimitsListener,
+    plan_interval_log_stats,
+    plan_interval_sweep_fsm_sessions,
+)
+from services.delivery_worker import DeliveryWorker
+from utils import BoundedMemoryStorage, DurableMemoryStorage
 
 logger = logging.getLogger(__name__)
 
@@ -52,45 +55,87 @@ async def main():
         # parse_mode='HTML'
         default=DefaultBotProperties(parse_mode="HTML"),
     )
-    storage: MemoryStorage = MemoryStorage()
-    dp: Dispatcher = Dispatcher(storage=storage)
 
     # Вывод кнопки меню
     await set_main_menu(bot)
 
+    storage: BoundedMemoryStorage | None = None
+    worker: DeliveryWorker | None = None
+    user_limits_listener: UserLimitsListener | None = None
+
     try:
-        # сборка метаданных
-        async with engine.begin() as conn:
-            logger.info("Create db metadata")
-            await conn.run_sync(Base.metadata.create_all)
-
-        # Настройка пула подключений к бд
-        pool_connect: Pool = await asyncpg.create_pool(
-            host=config.con_pool.db.host,
-            port=config.con_pool.db.port,
-            user=config.con_pool.user.user,
-            password=config.con_pool.user.password,
-        )
+        # Применим новые миграции схемы бд (если схема актуальна, только
+        # проверим ее версию). Миграции применяются на отдельном подключении
+        # до создания пула: пул при подключении подготавливает запросы к уже
+        # существующей схеме
+        migrations_connection: Connection = await connect(config.con_pool)
+        try:
+            await apply_migrations(migrations_connection)
+        finally:
+            await migrations_connection.close()
+
+        # Настройка пула подключений к бд (размеры и таймаут ожидания
+        # подключения берутся из конфига)
+        pool_connect: Pool = await create_pool(config.con_pool)
+
+        # Состояния пользователей хранятся в памяти, но не дольше заданного
+        # времени без обращений и не больше заданного количества. Если включено
+        # сохранение, изменения записываются в бд в фоне, а при запуске
+        # состояния загружаются обратно
+        if config.fsm_storage.persistent:
+            storage = DurableMemoryStorage(
+                pool=pool_connect,
+                max_size=config.fsm_storage.max_sessions,
+                ttl=config.fsm_storage.session_ttl * 60,
+            )
+            await storage.start()
+        else:
+            storage = BoundedMemoryStorage(
+                max_size=config.fsm_storage.max_sessions,
+                ttl=config.fsm_storage.session_ttl * 60,
+            )
+        dp: Dispatcher = Dispatcher(storage=storage)
 
         scheduler: AsyncIOScheduler = AsyncIOScheduler()
 
-        today_reminders: TodayRemindersClass = TodayRemindersClass(
-            scheduler=scheduler, bot=bot, pool=pool_connect
+        # Кэш премиум-статуса и количества заметок пользователей
+        user_limits: UserLimitsCacheClass = UserLimitsCacheClass()
+        # Количество заметок меняют и другие процессы (отправка удаляет
+        # отправленные заметки и секции прошедших дней) - сбрасываем записи
+        # кэша по уведомлениям из бд
+        user_limits_listener = UserLimitsListener(pool_connect, user_limits)
+        await user_limits_listener.start()
+        # Отправка напоминаний в этом же процессе. Если она запущена отдельно
+        # (python -m services.delivery_worker), бот только обрабатывает апдейты
+        if config.delivery.in_bot:
+            worker = DeliveryWorker(
+                bot=bot,
+                pool=pool_connect,
+                scheduler=scheduler,
+                user_limits=user_limits,
+                journal_path=config.delivery.journal_path,
+                catch_up_grace=config.delivery.catch_up_grace,
+            )
+            await worker.start()
+        else:
+            logger.info("Updates-only mode: reminders are delivered by workers")
+
+        plan_interval_log_stats(
+            scheduler=scheduler,
+            pool=pool_connect,
+            delivery=worker.delivery if worker is not None else None,
+            user_limits=user_limits,
+            listener=worker.listener if worker is not None else None,
+            fsm_storage=storage,
         )
-        plan_date_save_today_reminders(
-            scheduler=scheduler, pool=pool_connect, today_reminders=today_reminders
-        )
-        plan_cron_save_today_reminders(
-            scheduler=scheduler, pool=pool_connect, today_reminders=today_reminders
-        )
-
+        plan_interval_sweep_fsm_sessions(scheduler=scheduler, storage=storage)
         scheduler.start()
 
         # Регистрируем мидлвари
         dp.update.middleware.register(ProviderTokenMiddleware(config.prov_token))
         dp.update.middleware.register(DataBaseMiddleware(pool_connect))
         dp.update.middleware.register(SchedulerMiddleware(scheduler))
-        dp.update.middleware.register(TodayRemindersMiddleware(today_reminders))
+        dp.update.middleware.register(UserLimitsMiddleware(user_limits))
 
         # Регистрируем хэндлеры для оплаты премиума
         dp.message.register(order, Command(commands=["premium"]))
@@ -108,7 +153,7 @@ async def main():
 
         # Зарегистрируем мидлварь для adding_new_reminder.router
         adding_new_reminder.router.message.outer_middleware(
-            RemindersLimits(pool=pool_connect)
+            RemindersLimits(pool=pool_connect, user_limits=user_limits)
         )
 
         await bot.delete_webhook(drop_pending_updates=True)
@@ -116,8 +161,13 @@ async def main():
         logger.info("Start polling")
         await dp.start_polling(bot)
     finally:
-        logger.info("Dispose a db engine")
-        await engine.dispose()
+        if worker is not None:
+            await worker.stop()
+        if user_limits_listener is not None:
+            await user_limits_listener.stop()
+        # Записываем в бд изменения состояний, которые еще не были записаны
+        if storage is not None:
+            await storage.close()
 
 
 if __name__ == "__main__":
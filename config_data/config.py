@@ -23,6 +23,9 @@ class UserDB:
 class DB:
     host: str
     port: int
+    # Имя бд из DB_NAME (по умолчанию совпадает с именем пользователя).
+    # DATABASE из старых .env не читается: бд с таким именем может не быть
+    database: str | None
 
 
 @dataclass
@@ -31,6 +34,31 @@ class ConnectionsPool:
     user: UserDB
     min_size: int
     max_size: int
+    # Сколько секунд ждать свободное подключение (None - ждать без ограничения)
+    acquire_timeout: float | None
+
+
+@dataclass
+class Delivery:
+    # Файл-журнал с id отправленных, но еще не удаленных из бд заметок.
+    # Каждый процесс пишет свой журнал рядом с ним (см. DeliveredRemindersClass)
+    journal_path: str
+    # Заметки, время которых прошло, пока бот не работал, но не больше
+    # catch_up_grace минут назад, отправляются при запуске. 0 - не отправлять
+    catch_up_grace: float
+    # Отправлять напоминания в процессе бота. False - бот только обрабатывает
+    # апдейты, а напоминания отправляет python -m services.delivery_worker
+    in_bot: bool
+
+
+@dataclass
+class FsmStorage:
+    # Сколько минут хранится состояние пользователя без обращений к нему
+    session_ttl: float
+    # Максимальное количество состояний в памяти (лишние вытесняются)
+    max_sessions: int
+    # Сохранять состояния в бд, чтобы они переживали перезапуск бота
+    persistent: bool
 
 
 @dataclass
@@ -38,6 +66,8 @@ class Config:
     tg_bot: TgBot
     con_pool: ConnectionsPool
     prov_token: str  # PROVIDER_TOKEN
+    delivery: Delivery
+    fsm_storage: FsmStorage
 
 
 def load_config(path: str | None = None) -> Config:
@@ -48,10 +78,25 @@ def load_config(path: str | None = None) -> Config:
             token=env("BOT_TOKEN"), admin_ids=list(map(int, env.list("ADMIN_IDS")))
         ),
         con_pool=ConnectionsPool(
-            db=DB(host=env("HOST"), port=int(env("PORT"))),
+            db=DB(
+                host=env("HOST"),
+                port=int(env("PORT")),
+                database=env("DB_NAME", None) or None,
+            ),
             user=UserDB(user=env("USER"), password=env("PASSWORD")),
             min_size=int(env("POOL_MIN_SIZE")),
             max_size=int(env("POOL_MAX_SIZE")),
+            acquire_timeout=env.float("POOL_ACQUIRE_TIMEOUT", 10.0),
         ),
         prov_token=env("PROVIDER_TOKEN"),
+        delivery=Delivery(
+            journal_path=env("DELIVERED_JOURNAL", "delivered_reminders.journal"),
+            catch_up_grace=env.float("CATCH_UP_GRACE_MINUTES", 60.0),
+            in_bot=env.bool("DELIVERY_IN_BOT", True),
+        ),
+        fsm_storage=FsmStorage(
+            session_ttl=env.float("FSM_SESSION_TTL_MINUTES", 180.0),
+            max_sessions=env.int("FSM_MAX_SESSIONS", 50000),
+            persistent=env.bool("FSM_PERSISTENT", True),
+        ),
     )
@@ -2,19 +2,50 @@
 Пакет для работы с базами данных
 """
 
-from .connection_pool import DataBaseClass
+from .connection_pool import (
+    DataBaseClass,
+    PreparedConnection,
+    connect,
+    create_pool,
+    pool_metrics,
+    query_registry,
+)
+from .delivered_reminders import DeliveredRemindersClass
 from .methods import (
     add_new_user,
     add_reminder,
+    add_reminders_bulk,
+    claim_reminders,
+    claim_reminders_in_window,
+    count_reminders,
+    delete_expired_fsm_sessions,
+    delete_fsm_sessions,
     delete_irrelevant_reminders,
     delete_reminder,
     delete_some_reminders,
-    get_today_reminders,
+    delete_user_reminders,
+    drop_expired_reminders_partitions,
+    ensure_reminders_partitions,
+    get_page_cursor,
+    get_reminder_key,
+    get_reminders_in_window,
+    get_reminders_keys_in_window,
+    load_fsm_sessions,
+    lock_reminders_partitions,
+    renew_reminders_claims,
+    save_fsm_sessions,
     select_chosen_reminder,
     select_reminders,
+    select_reminders_by_ids,
+    select_reminders_page,
+    select_reminders_page_at,
     show_all_reminders,
+    unlock_reminders_partitions,
     update_reminder_date,
+    update_reminder_datetime,
     update_reminder_text,
     update_reminder_time,
 )
-from .today_reminders_list import TodayRemindersClass
+from .migrations import apply_migrations
+from .today_reminders_list import CLAIM_LEASE, TodayRemindersClass
+from .user_limits_cache import UserLimits, UserLimitsCacheClass
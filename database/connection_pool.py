@@ -2,15 +2,259 @@
 Модуль, для создания и хранения пула подключения в классе
 """
 
-from typing import Any, List, Tuple
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
 
-from asyncpg.pool import Pool
+import asyncpg
+from asyncpg import Connection
+from asyncpg.exceptions import (
+    UndefinedColumnError,
+    UndefinedFunctionError,
+    UndefinedTableError,
+)
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from config_data.config import ConnectionsPool
+
+# Границы корзин гистограммы ожидания подключения из пула (в миллисекундах)
+ACQUIRE_WAIT_BUCKETS_MS: Tuple[float, ...] = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PreparedConnection(Connection):
+    """
+    Подключение, на котором запросы из реестра подготавливаются заранее.
+    Передается в asyncpg.create_pool как connection_class.
+
+    Подготовленные запросы хранятся в кэше запросов asyncpg, который
+    принадлежит подключению и переживает его возврат в пул (объекты
+    PreparedStatement, полученные через prepare, после возврата подключения
+    в пул использовать нельзя). fetch/execute с тем же текстом запроса
+    берут подготовленный запрос из кэша.
+    """
+
+    # Подготавливаем запрос и кладем его в кэш запросов подключения
+    async def prepare_cached(self, command: str):
+        await self._prepare(command, use_cache=True)
+
+
+class QueryRegistry:
+    """
+    Реестр именованных запросов. Каждый запрос подготавливается один раз
+    на каждое подключение пула и после выполняется по имени. Для каждого
+    запроса считается количество вызовов и время выполнения.
+    """
+
+    def __init__(self):
+        self._queries: Dict[str, str] = {}
+        # Запросы, которые подготавливаются только при первом вызове
+        self._lazy: Set[str] = set()
+        # name -> [количество вызовов, суммарное время, максимальное время]
+        self._timings: Dict[str, List[float]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._queries
+
+    # Регистрируем запрос. Возвращаем его имя. Редкие запросы (lazy=True)
+    # не подготавливаются на каждом новом подключении, а только при вызове
+    def register(self, name: str, command: str, lazy: bool = False) -> str:
+        if name in self._queries and self._queries[name] != command:
+            raise ValueError(f"Query {name} is already registered")
+
+        self._queries[name] = command
+        if lazy:
+            self._lazy.add(name)
+        self._timings.setdefault(name, [0, 0.0, 0.0])
+        return name
+
+    # Хук init для asyncpg.create_pool: подготавливаем все запросы реестра
+    # (кроме lazy) на новом подключении. Миграции применяются до создания пула
+    # (см. connect), но если объекта бд из запроса все равно нет, запрос
+    # пропускается и подготовится при первом вызове
+    async def prepare_all(self, connection: PreparedConnection):
+        for name, command in self._queries.items():
+            if name in self._lazy:
+                continue
+            try:
+                await connection.prepare_cached(command)
+            except (UndefinedTableError, UndefinedColumnError, UndefinedFunctionError):
+                logging.debug("Query %s will be prepared on first use", name)
+
+    # Выполняем запрос по имени на подключении. Подготовленный запрос берется
+    # из кэша подключения (если его там нет, он подготовится и попадет в кэш).
+    # Если схема таблицы изменилась, asyncpg сам подготовит запрос заново
+    async def execute(
+        self,
+        connection: PreparedConnection | PoolConnectionProxy,
+        name: str,
+        *args,
+        fetch: bool = False,
+        fetchval: bool = False,
+        fetchrow: bool = False,
+        execute: bool = False,
+    ):
+        command: str = self._queries[name]
+        started_at: float = time.perf_counter()
+        try:
+            if fetch:
+                return await connection.fetch(command, *args)
+            elif fetchval:
+                return await connection.fetchval(command, *args)
+            elif fetchrow:
+                return await connection.fetchrow(command, *args)
+            return await connection.execute(command, *args)
+        finally:
+            elapsed: float = time.perf_counter() - started_at
+            timing: List[float] = self._timings[name]
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    # Текст запроса по имени
+    def command(self, name: str) -> str:
+        return self._queries[name]
+
+    # Время выполнения запросов (в миллисекундах)
+    def timings(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "calls": int(calls),
+                "avg_ms": round(total / calls * 1000, 3),
+                "max_ms": round(max_time * 1000, 3),
+            }
+            for name, (calls, total, max_time) in self._timings.items()
+            if calls
+        }
+
+
+# Реестр всех запросов бота (запросы регистрируются в methods.py)
+query_registry: QueryRegistry = QueryRegistry()
+
+
+class PoolMetrics:
+    """
+    Метрики пула подключений: гистограмма времени ожидания подключения,
+    количество таймаутов и занятые/свободные подключения. Все подключения
+    для запросов берутся из пула через acquire с таймаутом acquire_timeout.
+    """
+
+    def __init__(self, acquire_timeout: float | None = None):
+        self.acquire_timeout: float | None = acquire_timeout
+        # Последняя корзина - ожидания дольше последней границы
+        self._wait_buckets: List[int] = [0] * (len(ACQUIRE_WAIT_BUCKETS_MS) + 1)
+        self._acquired: int = 0
+        self._timeouts: int = 0
+        self._total_wait: float = 0.0
+        self._max_wait: float = 0.0
+
+    # Берем подключение из пула, замеряя время ожидания
+    @asynccontextmanager
+    async def acquire(self, pool: Pool) -> AsyncIterator[PoolConnectionProxy]:
+        started_at: float = time.perf_counter()
+        try:
+            connection: PoolConnectionProxy = await pool.acquire(
+                timeout=self.acquire_timeout
+            )
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            logging.warning(
+                "No free connection in the pool for %s sec", self.acquire_timeout
+            )
+            raise
+
+        wait: float = time.perf_counter() - started_at
+        self._acquired += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._wait_buckets[bisect_left(ACQUIRE_WAIT_BUCKETS_MS, wait * 1000)] += 1
+
+        try:
+            yield connection
+        finally:
+            await pool.release(connection)
+
+    def stats(self, pool: Pool) -> Dict[str, Any]:
+        labels: List[str] = [f"<={bound}ms" for bound in ACQUIRE_WAIT_BUCKETS_MS]
+        labels.append(f">{ACQUIRE_WAIT_BUCKETS_MS[-1]}ms")
+        idle: int = pool.get_idle_size()
+        return {
+            "size": pool.get_size(),
+            "in_use": pool.get_size() - idle,
+            "idle": idle,
+            "min_size": pool.get_min_size(),
+            "max_size": pool.get_max_size(),
+            "acquired": self._acquired,
+            "timeouts": self._timeouts,
+            "avg_wait_ms": (
+                round(self._total_wait / self._acquired * 1000, 3)
+                if self._acquired
+                else None
+            ),
+            "max_wait_ms": round(self._max_wait * 1000, 3),
+            "wait_histogram": dict(zip(labels, self._wait_buckets)),
+        }
+
+
+# Метрики единственного пула подключений бота (см. create_pool)
+pool_metrics: PoolMetrics = PoolMetrics()
+
+
+# Отдельное подключение к бд без реестра запросов (например, для миграций:
+# пока схема не создана, подготовить запросы реестра нельзя)
+async def connect(con_pool: ConnectionsPool) -> Connection:
+    return await asyncpg.connect(
+        host=con_pool.db.host,
+        port=con_pool.db.port,
+        database=con_pool.db.database,
+        user=con_pool.user.user,
+        password=con_pool.user.password,
+    )
+
+
+# Создаем пул подключений к бд. Это единственный пул бота: через него
+# выполняются все запросы. Пул создается после применения миграций
+async def create_pool(con_pool: ConnectionsPool) -> Pool:
+    pool_metrics.acquire_timeout = con_pool.acquire_timeout
+    return await asyncpg.create_pool(
+        host=con_pool.db.host,
+        port=con_pool.db.port,
+        database=con_pool.db.database,
+        user=con_pool.user.user,
+        password=con_pool.user.password,
+        min_size=con_pool.min_size,
+        max_size=con_pool.max_size,
+        # На каждом подключении запросы из реестра подготавливаются один раз
+        connection_class=PreparedConnection,
+        init=query_registry.prepare_all,
+    )
 
 
 class DataBaseClass:
+    """
+    Объект для выполнения запросов к бд. Если создан от пула, подключение
+    берется из пула только на время одного запроса, поэтому между запросами
+    (например, пока хэндлер отвечает пользователю) подключение свободно.
+    Если создан от подключения, все запросы выполняются на нем.
+    """
+
     def __init__(self, pool: Pool):
         self.pool = pool
 
+    # Берем одно подключение на несколько запросов подряд (например, чтобы
+    # выполнить их в транзакции). Внутри блока не стоит обращаться к Telegram:
+    # подключение будет занято все это время
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator["DataBaseClass"]:
+        if not isinstance(self.pool, Pool):
+            yield self
+            return
+
+        async with pool_metrics.acquire(self.pool) as connection:
+            yield DataBaseClass(connection)
+
     async def execute(
         self,
         command: str,
@@ -18,16 +262,40 @@ class DataBaseClass:
         fetch: bool = False,
         fetchval: bool = False,
         fetchrow: bool = False,
-        execute: bool = False
+        execute: bool = False,
+    ):
+        async with self.acquire() as database:
+            connection: PoolConnectionProxy = database.pool
+            if fetch:
+                return await connection.fetch(command, *args)
+            elif fetchval:
+                return await connection.fetchval(command, *args)
+            elif fetchrow:
+                return await connection.fetchrow(command, *args)
+            elif execute:
+                return await connection.execute(command, *args)
+
+    # Выполняем подготовленный запрос из реестра по его имени
+    async def execute_named(
+        self,
+        name: str,
+        *args,
+        fetch: bool = False,
+        fetchval: bool = False,
+        fetchrow: bool = False,
+        execute: bool = False,
     ):
-        if fetch:
-            return await self.pool.fetch(command, *args)
-        elif fetchval:
-            return await self.pool.fetchval(command, *args)
-        elif fetchrow:
-            return await self.pool.fetchrow(command, *args)
-        elif execute:
-            return await self.pool.execute(command, *args)
+        async with self.acquire() as database:
+            return await query_registry.execute(
+                database.pool,
+                name,
+                *args,
+                fetch=fetch,
+                fetchval=fetchval,
+                fetchrow=fetchrow,
+                execute=execute,
+            )
 
     async def executemany(self, command: str, input_data: List[Tuple[Any]]):
-        return await self.pool.executemany(command, input_data)
+        async with self.acquire() as database:
+            return await database.pool.executemany(command, input_data)
@@ -0,0 +1,241 @@
+"""
+Модуль, в котором хранится класс для пакетного удаления отправленных
+напоминаний из базы данных.
+
+id отправленных заметок копятся в буфере и удаляются одним запросом
+раз в flush_interval секунд (или сразу, если набралось batch_size id).
+Чтобы отправленные, но еще не удаленные заметки не ушли пользователям
+повторно, id дописываются (с fsync) в файл-журнал процесса.
+
+У каждого процесса свой журнал рядом с journal_path (имя включает хост
+и pid), и процесс раз в flush_interval обновляет время его изменения.
+Журналы, которые не обновлялись дольше stale_after, остались от
+остановленных или упавших процессов: их id удаляет из бд любой процесс
+с доступом к тому же каталогу (при запуске и периодически), после чего
+журнал удаляется. stale_after меньше аренды заметок, поэтому заметки
+упавшего процесса удаляются раньше, чем их заберет другой процесс.
+"""
+
+import asyncio
+import glob
+import logging
+import os
+import socket
+import time
+from collections import Counter
+from typing import Iterable, List, Optional, Set
+
+from asyncpg import Record
+from asyncpg.pool import Pool
+
+from .connection_pool import DataBaseClass
+from .methods import delete_some_reminders
+from .today_reminders_list import TodayRemindersClass
+from .user_limits_cache import UserLimitsCacheClass
+
+# Как часто удаляем накопленные заметки (в секундах)
+FLUSH_INTERVAL: float = 1.0
+# Сколько id должно накопиться, чтобы удалить их, не дожидаясь таймера
+BATCH_SIZE: int = 500
+# Через сколько секунд без обновления журнал считается журналом
+# остановленного процесса (должно быть меньше аренды заметок, CLAIM_LEASE)
+STALE_AFTER: float = 30.0
+
+
+class DeliveredRemindersClass:
+    def __init__(
+        self,
+        pool: Pool,
+        today_reminders: TodayRemindersClass,
+        journal_path: str,
+        user_limits: UserLimitsCacheClass | None = None,
+        flush_interval: float = FLUSH_INTERVAL,
+        batch_size: int = BATCH_SIZE,
+        stale_after: float = STALE_AFTER,
+    ):
+        self.pool: Pool = pool
+        self.today_reminders: TodayRemindersClass = today_reminders
+        self.user_limits: UserLimitsCacheClass | None = user_limits
+        self.journal_path: str = journal_path
+        self.flush_interval: float = flush_interval
+        self.batch_size: int = batch_size
+        self.stale_after: float = stale_after
+
+        # Журнал этого процесса: delivered.journal -> delivered.<хост>-<pid>.journal
+        root, ext = os.path.splitext(journal_path)
+        self._journal_pattern: str = f"{glob.escape(root)}.*{ext}"
+        self._own_path: str = f"{root}.{socket.gethostname()}-{os.getpid()}{ext}"
+
+        # id отправленных заметок, которые еще не удалены из бд
+        self._buffer: Set[int] = set()
+        self._journal = None
+        self._flush_needed: asyncio.Event = asyncio.Event()
+        self._flush_lock: asyncio.Lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __contains__(self, reminder_id: int) -> bool:
+        return reminder_id in self._buffer
+
+    # Удаляем из бд заметки из своего журнала и журналов остановленных
+    # процессов и запускаем периодическое удаление (нужен запущенный event loop)
+    async def start(self):
+        # Журнал с таким же именем остался от прошлого запуска (в контейнере
+        # после перезапуска совпадают и хост, и pid)
+        if os.path.exists(self._own_path):
+            self._buffer.update(self._read_journal(self._own_path))
+            logging.info(
+                "Restored %d delivered reminders from journal", len(self._buffer)
+            )
+        self._rewrite_journal(self._buffer)
+        await self._adopt_stale_journals()
+        await self.flush()
+
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    # Останавливаем периодическое удаление и удаляем все, что накопилось.
+    # Если удалить не удалось, id останутся в журнале, и его заберет этот
+    # или другой процесс (см. _adopt_stale_journals)
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        try:
+            await self.flush()
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+        # Все удалено - журнал больше не нужен
+        if os.path.exists(self._own_path):
+            os.remove(self._own_path)
+
+    # Запоминаем, что заметка отправлена и ее нужно удалить из бд
+    def add(self, reminder_id: int):
+        self._append((reminder_id,))
+
+        if len(self._buffer) >= self.batch_size:
+            self._flush_needed.set()
+
+    # Удаляем из бд все накопленные заметки одним запросом
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+
+            reminder_ids: List[int] = list(self._buffer)
+            deleted: List[Record] = await delete_some_reminders(
+                DataBaseClass(self.pool), reminder_ids
+            )
+
+            self._buffer.difference_update(reminder_ids)
+            self._rewrite_journal(self._buffer)
+            self.today_reminders.finish(reminder_ids)
+
+            # Уменьшим количество заметок владельцев в кэше лимитов
+            if self.user_limits is not None:
+                deleted_by_user: Counter = Counter(row["user_id"] for row in deleted)
+                for user_id, count in deleted_by_user.items():
+                    self.user_limits.change_num_reminders(user_id, -count)
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+
+            try:
+                # Журнал этого процесса не должен считаться брошенным (если его
+                # все же забрал другой процесс, запишем журнал заново)
+                if os.path.exists(self._own_path):
+                    os.utime(self._own_path)
+                else:
+                    self._rewrite_journal(self._buffer)
+                await self._adopt_stale_journals()
+                await self.flush()
+            except Exception:
+                logging.exception(
+                    "Failed to delete %d delivered reminders", len(self._buffer)
+                )
+
+    # Забираем id из журналов, которые давно не обновлялись (их процессы
+    # остановлены или упали), удаляем эти заметки из бд и удаляем журналы.
+    # id сначала записываются в свой журнал, чтобы не потеряться, если этот
+    # процесс упадет до удаления
+    async def _adopt_stale_journals(self):
+        stale_before: float = time.time() - self.stale_after
+        adopted: List[str] = []
+        paths: List[str] = glob.glob(self._journal_pattern)
+        # Журнал в journal_path (общий журнал прежних версий)
+        if os.path.exists(self.journal_path):
+            paths.append(self.journal_path)
+
+        for path in paths:
+            if path == self._own_path or path.endswith(".tmp"):
+                continue
+            try:
+                if os.path.getmtime(path) > stale_before:
+                    continue
+                reminder_ids: List[int] = self._read_journal(path)
+            except FileNotFoundError:
+                # Журнал уже забрал другой процесс
+                continue
+
+            self._append(
+                reminder_id
+                for reminder_id in reminder_ids
+                if reminder_id not in self._buffer
+            )
+            adopted.append(path)
+
+        if not adopted:
+            return
+
+        logging.info(
+            "Adopted %d stale delivery journals (%d reminders to delete)",
+            len(adopted),
+            len(self._buffer),
+        )
+        await self.flush()
+        for path in adopted:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # Добавляем id в буфер и в журнал. Журнал сбрасывается на диск до того,
+    # как отправка продолжится, поэтому id не потеряется при падении процесса
+    def _append(self, reminder_ids: Iterable[int]):
+        reminder_ids = list(reminder_ids)
+        self._buffer.update(reminder_ids)
+        self._journal.writelines(f"{reminder_id}\n" for reminder_id in reminder_ids)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    @staticmethod
+    def _read_journal(path: str) -> List[int]:
+        with open(path) as journal:
+            return [int(line) for line in journal if line.strip()]
+
+    # Перезаписываем журнал, оставляя в нем только не удаленные из бд id
+    def _rewrite_journal(self, reminder_ids: Iterable[int]):
+        tmp_path: str = self._own_path + ".tmp"
+        with open(tmp_path, "w") as journal:
+            journal.writelines(f"{reminder_id}\n" for reminder_id in reminder_ids)
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        if self._journal is not None:
+            self._journal.close()
+        os.replace(tmp_path, self._own_path)
+        self._journal = open(self._own_path, "a")
@@ -3,26 +3,47 @@
 """
 
 from datetime import date, datetime, time
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 from asyncpg import Record
 
-from .connection_pool import DataBaseClass
+from .connection_pool import DataBaseClass, query_registry
+from .migrations import PARTITIONS_LOCK_KEY
 
+# Все запросы регистрируются в реестре при импорте модуля, подготавливаются
+# один раз на каждое подключение пула и выполняются по имени
 
-# Добавим в таблицу Users нового пользователя
+ADD_NEW_USER: str = query_registry.register(
+    "add_new_user",
+    """
+    INSERT INTO "Users"
+    VALUES($1, false, 0)
+    ON CONFLICT (user_id) DO NOTHING;
+    """,
+)
+
+
+# Добавим в таблицу Users нового пользователя. Для уже существующего
+# пользователя ничего не меняем: премиум-статус сохраняется, а счетчик
+# заметок поддерживают триггеры (см. миграцию 3)
 async def add_new_user(connector: DataBaseClass, user_id: int):
-    command = """
-        INSERT INTO "Users"
-        VALUES($1, false, 0)
-        ON CONFLICT (user_id) DO UPDATE
-            SET premium = excluded.premium,
-                num_reminders = excluded.num_reminders;
-        """
-    await connector.execute(command, user_id, execute=True)
+    await connector.execute_named(ADD_NEW_USER, user_id, execute=True)
+
+
+ADD_REMINDER: str = query_registry.register(
+    "add_reminder",
+    """
+    INSERT INTO "Reminders" (
+        user_id, reminder_date, reminder_time, reminder_text,
+        last_reminder, file_id, file_unique_id, msg_type
+    )
+    VALUES($1, $2, $3, $4, False, $5, $6, $7)
+    RETURNING *;
+    """,
+)
 
 
-# Добавим в таблицу Reminders новую заметку
+# Добавим в таблицу Reminders новую заметку и сразу получим ее
 async def add_reminder(
     connector: DataBaseClass,
     user_id: int,
@@ -33,44 +54,87 @@ async def add_reminder(
     file_unique_id: Optional[str] = None,
     msg_type: str = "text",
 ) -> Record:
-    # Добавим заметку в базу данных
-    command1 = """
-        INSERT INTO "Reminders"
-        VALUES(DEFAULT, $1, $2, $3, $4, $5, $6, $7, $8)
-        ON CONFLICT (reminder_id) DO UPDATE
-            SET reminder_date = excluded.reminder_date,
-                reminder_time = excluded.reminder_time,
-                reminder_text = excluded.reminder_text;
-        """
-    await connector.execute(
-        command1,
+    return await connector.execute_named(
+        ADD_REMINDER,
         *[
             user_id,
             reminder_date,
             reminder_time,
             reminder_text,
-            True,
             file_id,
             file_unique_id,
             msg_type,
         ],
-        execute=True
+        fetchrow=True,
     )
-    # Получим последнюю заметку
-    command2 = """
-        SELECT * FROM "Reminders"
-        WHERE last_reminder = True
-        """
-    result_reminder = await connector.execute(command2, fetchrow=True)
-    # Изменим у последней заметки параметр last_reminder на False
-    command3 = """
-        UPDATE "Reminders"
-        SET last_reminder = False
-        WHERE last_reminder = True;
-        """
-    await connector.execute(command3, execute=True)
 
-    return result_reminder
+
+# Массовое добавление нужно редко (импорт, повторяющиеся заметки), поэтому
+# запрос подготавливается только при первом вызове
+ADD_REMINDERS_BULK: str = query_registry.register(
+    "add_reminders_bulk",
+    """
+    INSERT INTO "Reminders" (
+        user_id, reminder_date, reminder_time, reminder_text,
+        last_reminder, file_id, file_unique_id, msg_type
+    )
+    SELECT
+        user_id, reminder_date, reminder_time, reminder_text,
+        False, file_id, file_unique_id, msg_type
+    FROM unnest(
+        $1::int[], $2::date[], $3::time[], $4::text[],
+        $5::text[], $6::text[], $7::text[]
+    ) AS new_reminders(
+        user_id, reminder_date, reminder_time, reminder_text,
+        file_id, file_unique_id, msg_type
+    )
+    RETURNING *;
+    """,
+    lazy=True,
+)
+
+
+# Добавим в таблицу Reminders сразу несколько заметок одним запросом.
+# Каждая заметка - словарь (или Record) с ключами как у аргументов add_reminder
+async def add_reminders_bulk(
+    connector: DataBaseClass, reminders: List[Mapping[str, Any]]
+) -> List[Record]:
+    if not reminders:
+        return []
+
+    return await connector.execute_named(
+        ADD_REMINDERS_BULK,
+        *[
+            [reminder["user_id"] for reminder in reminders],
+            [reminder["reminder_date"] for reminder in reminders],
+            [reminder["reminder_time"] for reminder in reminders],
+            [reminder.get("reminder_text") for reminder in reminders],
+            [reminder.get("file_id") for reminder in reminders],
+            [reminder.get("file_unique_id") for reminder in reminders],
+            [reminder.get("msg_type") or "text" for reminder in reminders],
+        ],
+        fetch=True,
+    )
+
+
+SELECT_ALL_REMINDERS: str = query_registry.register(
+    "select_all_reminders",
+    """
+    SELECT *
+    FROM "Reminders"
+    WHERE user_id = $1
+    ORDER BY reminder_date, reminder_time;
+    """,
+)
+SELECT_REMINDERS_ON_DATE: str = query_registry.register(
+    "select_reminders_on_date",
+    """
+    SELECT *
+    FROM "Reminders"
+    WHERE user_id = $1 AND reminder_date = $2
+    ORDER BY reminder_date, reminder_time;
+    """,
+)
 
 
 # Выберем в таблице Reminders заметки на выбранную дату или все заметки
@@ -80,159 +144,784 @@ async def select_reminders(
     reminder_date: date | None,
     all_reminders: bool = False,
 ) -> List[Record]:
-    command: str
-    args: List[int | date]
-
     if all_reminders:
-        command = """
-            SELECT *
-            FROM "Reminders"
-            WHERE user_id = $1
-            ORDER BY reminder_date, reminder_time;
-            """
-        args = [user_id]
-    else:
-        command = """
-            SELECT *
-            FROM "Reminders"
-            WHERE user_id = $1 AND reminder_date = $2
-            ORDER BY reminder_date, reminder_time;
-            """
-        args = [user_id, reminder_date]
-
-    request_result: List[Record] = await connector.execute(command, *args, fetch=True)
-    return request_result
+        return await connector.execute_named(SELECT_ALL_REMINDERS, user_id, fetch=True)
+
+    return await connector.execute_named(
+        SELECT_REMINDERS_ON_DATE, user_id, reminder_date, fetch=True
+    )
+
+
+# Ключ заметки для постраничного просмотра (порядок сортировки списка)
+def get_reminder_key(reminder: Record) -> Tuple[date, time, int]:
+    return (
+        reminder["reminder_date"],
+        reminder["reminder_time"],
+        reminder["reminder_id"],
+    )
+
+
+# Курсор показанной страницы для хранения в состоянии FSM: id ее заметок
+# и ключи первой и последней заметки. Сами заметки в состоянии не хранятся,
+# их достают из бд по id, когда нужно заново нарисовать страницу
+def get_page_cursor(page: List[Record]) -> Dict[str, Any]:
+    return {
+        "reminder_ids": [reminder["reminder_id"] for reminder in page],
+        "first_key": get_reminder_key(page[0]) if page else None,
+        "last_key": get_reminder_key(page[-1]) if page else None,
+    }
+
+
+# Зарегистрируем запрос страницы заметок для одного направления движения
+def _register_page_query(
+    direction: str, comparison: str, order: str, with_date: bool
+) -> str:
+    date_condition: str = "AND reminder_date = $6" if with_date else ""
+    return query_registry.register(
+        f"select_reminders_page_{direction}" + ("_on_date" if with_date else ""),
+        f"""
+        SELECT * FROM "Reminders"
+        WHERE user_id = $1 {date_condition}
+            AND (reminder_date, reminder_time, reminder_id) {comparison} ($2, $3, $4)
+        ORDER BY reminder_date {order}, reminder_time {order}, reminder_id {order}
+        LIMIT $5;
+        """,
+    )
+
+
+# (направление, с датой или без) -> имя запроса страницы. Направления:
+# after - после ключа, before - перед ключом (в обратном порядке),
+# start - начиная с ключа
+SELECT_REMINDERS_PAGE: Dict[Tuple[str, bool], str] = {
+    (direction, with_date): _register_page_query(
+        direction, comparison, order, with_date
+    )
+    for direction, comparison, order in (
+        ("after", ">", "ASC"),
+        ("before", "<", "DESC"),
+        ("start", ">=", "ASC"),
+    )
+    for with_date in (False, True)
+}
+
+
+# Выберем в таблице Reminders одну страницу заметок пользователя на выбранную
+# дату (или всех заметок, если дата не указана). Страница начинается сразу
+# после ключа after, заканчивается прямо перед ключом before или начинается
+# с ключа start (включительно). Если ключ не указан - первая страница
+async def select_reminders_page(
+    connector: DataBaseClass,
+    user_id: int,
+    reminder_date: date | None,
+    page_size: int,
+    after: Optional[Tuple[date, time, int]] = None,
+    before: Optional[Tuple[date, time, int]] = None,
+    start: Optional[Tuple[date, time, int]] = None,
+) -> List[Record]:
+    direction: str = "after"
+    key: Tuple[date, time, int] = (date.min, time.min, 0)
+
+    if before is not None:
+        direction, key = "before", before
+    elif start is not None:
+        direction, key = "start", start
+    elif after is not None:
+        key = after
+
+    args: List[Any] = [user_id, *key, page_size]
+    if reminder_date:
+        args.append(reminder_date)
+
+    page: List[Record] = await connector.execute_named(
+        SELECT_REMINDERS_PAGE[(direction, bool(reminder_date))], *args, fetch=True
+    )
+    # При движении назад заметки выбраны в обратном порядке
+    if before is not None:
+        page.reverse()
+    return page
+
+
+# (с датой или без) -> имя запроса страницы по позиции ее первой заметки.
+# Нужен только для перехода сразу на выбранную страницу, при листании
+# используется ключ заметки
+SELECT_REMINDERS_PAGE_AT: Dict[bool, str] = {
+    with_date: query_registry.register(
+        "select_reminders_page_at" + ("_on_date" if with_date else ""),
+        f"""
+        SELECT * FROM "Reminders"
+        WHERE user_id = $1 {"AND reminder_date = $4" if with_date else ""}
+        ORDER BY reminder_date, reminder_time, reminder_id
+        OFFSET $2
+        LIMIT $3;
+        """,
+    )
+    for with_date in (False, True)
+}
+
+
+# Достанем страницу заметок, которая начинается с заметки под номером
+# pos_first_elem (считая с нуля)
+async def select_reminders_page_at(
+    connector: DataBaseClass,
+    user_id: int,
+    reminder_date: date | None,
+    page_size: int,
+    pos_first_elem: int,
+) -> List[Record]:
+    args: List[Any] = [user_id, pos_first_elem, page_size]
+    if reminder_date:
+        args.append(reminder_date)
+
+    return await connector.execute_named(
+        SELECT_REMINDERS_PAGE_AT[bool(reminder_date)], *args, fetch=True
+    )
+
+
+SELECT_REMINDERS_BY_IDS: str = query_registry.register(
+    "select_reminders_by_ids",
+    """
+    SELECT * FROM "Reminders"
+    WHERE user_id = $1 AND reminder_id = ANY($2::int[])
+    ORDER BY reminder_date, reminder_time, reminder_id;
+    """,
+)
+
+
+# Достанем заметки показанной страницы по их id (в порядке списка). Заметки,
+# которые успели удалить или отправить, на странице больше не покажутся
+async def select_reminders_by_ids(
+    connector: DataBaseClass, user_id: int, reminder_ids: List[int]
+) -> List[Record]:
+    if not reminder_ids:
+        return []
+
+    return await connector.execute_named(
+        SELECT_REMINDERS_BY_IDS, user_id, reminder_ids, fetch=True
+    )
+
+
+COUNT_ALL_REMINDERS: str = query_registry.register(
+    "count_all_reminders",
+    """
+    SELECT COUNT(*) FROM "Reminders"
+    WHERE user_id = $1;
+    """,
+)
+COUNT_REMINDERS_ON_DATE: str = query_registry.register(
+    "count_reminders_on_date",
+    """
+    SELECT COUNT(*) FROM "Reminders"
+    WHERE user_id = $1 AND reminder_date = $2;
+    """,
+)
+
+
+# Посчитаем количество заметок пользователя на выбранную дату (или всех заметок)
+async def count_reminders(
+    connector: DataBaseClass, user_id: int, reminder_date: date | None
+) -> int:
+    if reminder_date:
+        return await connector.execute_named(
+            COUNT_REMINDERS_ON_DATE, user_id, reminder_date, fetchval=True
+        )
+
+    return await connector.execute_named(COUNT_ALL_REMINDERS, user_id, fetchval=True)
+
+
+SELECT_CHOSEN_REMINDER: str = query_registry.register(
+    "select_chosen_reminder",
+    """
+    SELECT *
+    FROM "Reminders"
+    WHERE reminder_id = $1
+    """,
+)
 
 
 # Выберем в таблице Reminders определенную заметку
 async def select_chosen_reminder(connector: DataBaseClass, reminder_id: int) -> Record:
-    command: str = """
-        SELECT *
-        FROM "Reminders"
-        WHERE reminder_id = $1
-        """
-    return await connector.execute(command, reminder_id, fetchrow=True)
+    return await connector.execute_named(
+        SELECT_CHOSEN_REMINDER, reminder_id, fetchrow=True
+    )
+
+
+DELETE_REMINDER: str = query_registry.register(
+    "delete_reminder",
+    """
+    DELETE FROM "Reminders"
+    WHERE reminder_id = $1
+    RETURNING reminder_id;
+    """,
+)
 
 
-# Удалим в таблице Reminders определенную заметку
-async def delete_reminder(connector: DataBaseClass, reminder_id: int) -> None:
-    command = """
-        DELETE FROM "Reminders"
-        WHERE reminder_id = $1;
-        """
-    await connector.execute(command, reminder_id, execute=True)
+# Удалим в таблице Reminders определенную заметку. Возвращаем True, если
+# заметка была удалена (False, если ее уже нет)
+async def delete_reminder(connector: DataBaseClass, reminder_id: int) -> bool:
+    return (
+        await connector.execute_named(DELETE_REMINDER, reminder_id, fetchval=True)
+        is not None
+    )
+
+
+UPDATE_REMINDER_TEXT: str = query_registry.register(
+    "update_reminder_text",
+    """
+    UPDATE "Reminders"
+    SET reminder_text = $1
+    WHERE reminder_id = $2
+    RETURNING *;
+    """,
+)
 
 
-# Обновим в таблице Reminders в определенной заметке текст
+# Обновим в таблице Reminders в определенной заметке текст и сразу получим
+# измененную заметку (None, если заметки уже нет)
 async def update_reminder_text(
     connector: DataBaseClass, reminder_id: int, new_reminder_text: str
-) -> None:
-    command = """
-        UPDATE "Reminders"
-        SET reminder_text = $1
-        WHERE reminder_id = $2;
-        """
-    await connector.execute(command, *[new_reminder_text, reminder_id], execute=True)
+) -> Record | None:
+    return await connector.execute_named(
+        UPDATE_REMINDER_TEXT, *[new_reminder_text, reminder_id], fetchrow=True
+    )
+
 
+UPDATE_REMINDER_DATE: str = query_registry.register(
+    "update_reminder_date",
+    """
+    UPDATE "Reminders"
+    SET reminder_date = $1
+    WHERE reminder_id = $2
+    RETURNING *;
+    """,
+)
 
-# Обновим в таблице Reminders в определенной заметке дату
+
+# Обновим в таблице Reminders в определенной заметке дату и сразу получим
+# измененную заметку (None, если заметки уже нет)
 async def update_reminder_date(
     connector: DataBaseClass, reminder_id: int, new_reminder_date: date
-) -> None:
-    command = """
-        UPDATE "Reminders"
-        SET reminder_date = $1
-        WHERE reminder_id = $2;
-        """
-    await connector.execute(command, *[new_reminder_date, reminder_id], execute=True)
+) -> Record | None:
+    return await connector.execute_named(
+        UPDATE_REMINDER_DATE, *[new_reminder_date, reminder_id], fetchrow=True
+    )
+
 
+UPDATE_REMINDER_TIME: str = query_registry.register(
+    "update_reminder_time",
+    """
+    UPDATE "Reminders"
+    SET reminder_time = $1
+    WHERE reminder_id = $2
+    RETURNING *;
+    """,
+)
 
-# Обновим в таблице Reminders в определенной заметке время
+
+# Обновим в таблице Reminders в определенной заметке время и сразу получим
+# измененную заметку (None, если заметки уже нет)
 async def update_reminder_time(
     connector: DataBaseClass, reminder_id: int, new_reminder_time: time
-):
-    command = """
-        UPDATE "Reminders"
-        SET reminder_time = $1
-        WHERE reminder_id = $2
-        """
-    await connector.execute(command, *[new_reminder_time, reminder_id], execute=True)
+) -> Record | None:
+    return await connector.execute_named(
+        UPDATE_REMINDER_TIME, *[new_reminder_time, reminder_id], fetchrow=True
+    )
+
+
+UPDATE_REMINDER_DATETIME: str = query_registry.register(
+    "update_reminder_datetime",
+    """
+    UPDATE "Reminders"
+    SET reminder_date = $1, reminder_time = $2
+    WHERE reminder_id = $3
+    RETURNING *;
+    """,
+)
+
+
+# Обновим в таблице Reminders в определенной заметке сразу дату и время
+# и получим измененную заметку (None, если заметки уже нет)
+async def update_reminder_datetime(
+    connector: DataBaseClass,
+    reminder_id: int,
+    new_reminder_date: date,
+    new_reminder_time: time,
+) -> Record | None:
+    return await connector.execute_named(
+        UPDATE_REMINDER_DATETIME,
+        *[new_reminder_date, new_reminder_time, reminder_id],
+        fetchrow=True,
+    )
 
 
 # Выберем в таблице Reminders все (полные) заметки определенного пользователя
 async def show_all_reminders(connector: DataBaseClass, user_id: int) -> List[Record]:
-    command = """
-        SELECT * FROM "Reminders"
-        WHERE user_id = $1
+    return await connector.execute_named(SELECT_ALL_REMINDERS, user_id, fetch=True)
+
+
+GET_REMINDERS_IN_WINDOW: str = query_registry.register(
+    "get_reminders_in_window",
+    """
+    SELECT * FROM "Reminders"
+    WHERE reminder_date BETWEEN $1 AND $3
+        AND (reminder_date, reminder_time) >= ($1, $2)
+        AND (reminder_date, reminder_time) < ($3, $4)
+    ORDER BY reminder_date, reminder_time
+    """,
+)
+
+
+# Выберем в таблице Reminders заметки всех пользователей со временем отправки
+# в [window_start, window_end). Условие на reminder_date отдельно позволяет
+# читать только секции дней окна, сравнение пар идет по ix_reminders_date_time
+async def get_reminders_in_window(
+    connector: DataBaseClass, window_start: datetime, window_end: datetime
+) -> List[Record]:
+    return await connector.execute_named(
+        GET_REMINDERS_IN_WINDOW,
+        window_start.date(),
+        window_start.time(),
+        window_end.date(),
+        window_end.time(),
+        fetch=True,
+    )
+
+
+GET_REMINDERS_KEYS_IN_WINDOW: str = query_registry.register(
+    "get_reminders_keys_in_window",
+    """
+    SELECT reminder_id, reminder_date, reminder_time FROM "Reminders"
+    WHERE reminder_date BETWEEN $1 AND $3
+        AND (reminder_date, reminder_time, reminder_id) > ($1, $2, $5)
+        AND (reminder_date, reminder_time) < ($3, $4)
+    ORDER BY reminder_date, reminder_time, reminder_id
+    LIMIT $6
+    """,
+)
+
+
+# Ключи (id, дата и время) не больше limit заметок со временем отправки
+# в [window_start, window_end), которые идут после заметки с ключом after
+# (None - с начала окна). Каждая пачка - отдельный короткий запрос, поэтому
+# между пачками подключение свободно
+async def get_reminders_keys_in_window(
+    connector: DataBaseClass,
+    window_start: datetime,
+    window_end: datetime,
+    after: Tuple[date, time, int] | None,
+    limit: int,
+) -> List[Record]:
+    # id заметок положительные, поэтому ключ (начало окна, 0) меньше
+    # ключа любой заметки окна
+    after_date, after_time, after_id = after or (
+        window_start.date(),
+        window_start.time(),
+        0,
+    )
+    return await connector.execute_named(
+        GET_REMINDERS_KEYS_IN_WINDOW,
+        after_date,
+        after_time,
+        window_end.date(),
+        window_end.time(),
+        after_id,
+        limit,
+        fetch=True,
+    )
+
+
+CLAIM_REMINDERS_IN_WINDOW: str = query_registry.register(
+    "claim_reminders_in_window",
+    """
+    WITH due AS (
+        SELECT reminder_id, reminder_date FROM "Reminders"
+        WHERE reminder_date BETWEEN $1 AND $3
+            AND (reminder_date, reminder_time) >= ($1, $2)
+            AND (reminder_date, reminder_time) < ($3, $4)
+            AND (claimed_by IS NULL OR claimed_by = $5 OR claimed_until < $6)
         ORDER BY reminder_date, reminder_time
-        """
-    return await connector.execute(command, user_id, fetch=True)
+        LIMIT $8
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE "Reminders" AS reminders
+    SET claimed_by = $5, claimed_until = $7
+    FROM due
+    WHERE reminders.reminder_id = due.reminder_id
+        AND reminders.reminder_date = due.reminder_date
+    RETURNING reminders.*;
+    """,
+)
+
+
+# Берем в аренду заметки со временем отправки в [window_start, window_end),
+# которые никем не арендованы или аренда которых истекла к now (не больше
+# limit самых ранних). Заметки, заблокированные другим процессом, пропускаются
+# (SKIP LOCKED), поэтому одну заметку получит только один процесс.
+# Возвращаем арендованные заметки
+async def claim_reminders_in_window(
+    connector: DataBaseClass,
+    window_start: datetime,
+    window_end: datetime,
+    owner: str,
+    now: datetime,
+    claimed_until: datetime,
+    limit: int,
+) -> List[Record]:
+    return await connector.execute_named(
+        CLAIM_REMINDERS_IN_WINDOW,
+        window_start.date(),
+        window_start.time(),
+        window_end.date(),
+        window_end.time(),
+        owner,
+        now,
+        claimed_until,
+        limit,
+        fetch=True,
+    )
 
 
-# Выберем в таблице Reminders заметки всех пользователей на сегодняшний день
-async def get_today_reminders(connector: DataBaseClass) -> List[Record]:
-    command = """
-        SELECT * FROM "Reminders"
-        WHERE reminder_date = $1
-        ORDER BY reminder_time
-        """
-    return await connector.execute(command, date.today(), fetch=True)
+CLAIM_REMINDERS: str = query_registry.register(
+    "claim_reminders",
+    """
+    UPDATE "Reminders"
+    SET claimed_by = $2, claimed_until = $4
+    WHERE reminder_id = ANY($1::int[])
+        AND (claimed_by IS NULL OR claimed_by = $2 OR claimed_until < $3)
+    RETURNING *;
+    """,
+)
+
+
+# Берем в аренду заметки по их id (если они не арендованы другим процессом).
+# Возвращаем арендованные заметки
+async def claim_reminders(
+    connector: DataBaseClass,
+    reminder_ids: List[int],
+    owner: str,
+    now: datetime,
+    claimed_until: datetime,
+) -> List[Record]:
+    return await connector.execute_named(
+        CLAIM_REMINDERS, reminder_ids, owner, now, claimed_until, fetch=True
+    )
+
 
+RENEW_REMINDERS_CLAIMS: str = query_registry.register(
+    "renew_reminders_claims",
+    """
+    UPDATE "Reminders"
+    SET claimed_until = $3
+    WHERE reminder_id = ANY($1::int[]) AND claimed_by = $2
+    RETURNING reminder_id;
+    """,
+)
 
-# Удалим из таблицы Reminders несколько заметок
+
+# Продлеваем аренду заметок процесса owner. Возвращаем id заметок, аренду
+# которых удалось продлить (остальные удалены или забраны другим процессом)
+async def renew_reminders_claims(
+    connector: DataBaseClass,
+    reminder_ids: List[int],
+    owner: str,
+    claimed_until: datetime,
+) -> List[int]:
+    rows: List[Record] = await connector.execute_named(
+        RENEW_REMINDERS_CLAIMS, reminder_ids, owner, claimed_until, fetch=True
+    )
+    return [row["reminder_id"] for row in rows]
+
+
+DELETE_SOME_REMINDERS: str = query_registry.register(
+    "delete_some_reminders",
+    """
+    DELETE FROM "Reminders"
+    WHERE reminder_id = ANY($1::int[])
+    RETURNING reminder_id, user_id;
+    """,
+)
+
+
+# Удалим из таблицы Reminders несколько заметок одним запросом.
+# Возвращаем id и владельцев удаленных заметок
 async def delete_some_reminders(
-    connector: DataBaseClass, input_data: List[Tuple[int]]
-) -> None:
-    command = """
-        DELETE FROM "Reminders"
-        WHERE reminder_id = $1;
-        """
-    await connector.executemany(command, input_data)
+    connector: DataBaseClass, reminder_ids: List[int]
+) -> List[Record]:
+    return await connector.execute_named(
+        DELETE_SOME_REMINDERS, reminder_ids, fetch=True
+    )
+
+
+DELETE_USER_REMINDERS: str = query_registry.register(
+    "delete_user_reminders",
+    """
+    DELETE FROM "Reminders"
+    WHERE user_id = $1 AND reminder_id = ANY($2::int[])
+    RETURNING reminder_id, user_id, reminder_date, reminder_time;
+    """,
+)
+
+
+# Удалим несколько заметок пользователя одним запросом. Заметки других
+# пользователей не удаляются, даже если их id переданы. Возвращаем id, владельца,
+# дату и время удаленных заметок
+async def delete_user_reminders(
+    connector: DataBaseClass, user_id: int, reminder_ids: List[int]
+) -> List[Record]:
+    return await connector.execute_named(
+        DELETE_USER_REMINDERS, user_id, reminder_ids, fetch=True
+    )
+
+
+DELETE_IRRELEVANT_REMINDERS: str = query_registry.register(
+    "delete_irrelevant_reminders",
+    """
+    DELETE FROM "Reminders"
+    WHERE reminder_date = $1 AND reminder_time < $2;
+    """,
+)
+
+
+# Удалим неактуальные заметки за день before со временем раньше before. Запрос
+# читает только одну секцию и заметки более ранних дней не трогает: они
+# удаляются только вместе с секциями прошедших дней (см.
+# drop_expired_reminders_partitions), поэтому без удаления секций (например,
+# если обслуживание секций не выполнялось) такие заметки останутся в бд
+async def delete_irrelevant_reminders(connector: DataBaseClass, before: datetime):
+    await connector.execute_named(
+        DELETE_IRRELEVANT_REMINDERS, before.date(), before.time(), execute=True
+    )
+
+
+LOCK_REMINDERS_PARTITIONS: str = query_registry.register(
+    "lock_reminders_partitions",
+    """
+    SELECT pg_try_advisory_lock($1);
+    """,
+    lazy=True,
+)
 
 
-# Удалим неактуальные заметки
-async def delete_irrelevant_reminders(connector: DataBaseClass):
-    command = """
-        DELETE FROM "Reminders"
-        WHERE (reminder_time < $1 AND reminder_date = $2)
-        OR (reminder_date < $2);
-        """
-    await connector.execute(
-        command, *[datetime.now().time(), date.today()], execute=True
+# Пробуем взять блокировку обслуживания секций таблицы Reminders на время
+# сессии подключения (connector должен держать одно подключение, см.
+# DataBaseClass.acquire). False - секции обслуживает другой процесс
+async def lock_reminders_partitions(connector: DataBaseClass) -> bool:
+    return await connector.execute_named(
+        LOCK_REMINDERS_PARTITIONS, PARTITIONS_LOCK_KEY, fetchval=True
     )
 
 
+UNLOCK_REMINDERS_PARTITIONS: str = query_registry.register(
+    "unlock_reminders_partitions",
+    """
+    SELECT pg_advisory_unlock($1);
+    """,
+    lazy=True,
+)
+
+
+async def unlock_reminders_partitions(connector: DataBaseClass):
+    await connector.execute_named(
+        UNLOCK_REMINDERS_PARTITIONS, PARTITIONS_LOCK_KEY, execute=True
+    )
+
+
+ENSURE_REMINDERS_PARTITIONS: str = query_registry.register(
+    "ensure_reminders_partitions",
+    """
+    SELECT reminders_ensure_partitions($1, $2);
+    """,
+    lazy=True,
+)
+
+
+# Создадим секции таблицы Reminders на дни [first_day, first_day + days_ahead],
+# которых еще нет. Возвращаем количество созданных секций
+async def ensure_reminders_partitions(
+    connector: DataBaseClass, first_day: date, days_ahead: int
+) -> int:
+    return await connector.execute_named(
+        ENSURE_REMINDERS_PARTITIONS, first_day, days_ahead, fetchval=True
+    )
+
+
+DROP_EXPIRED_REMINDERS_PARTITIONS: str = query_registry.register(
+    "drop_expired_reminders_partitions",
+    """
+    SELECT reminders_drop_expired_partitions($1);
+    """,
+    lazy=True,
+)
+
+
+# Удалим секции таблицы Reminders за дни до first_day (счетчики заметок
+# пользователей уменьшаются). Возвращаем количество удаленных секций
+async def drop_expired_reminders_partitions(
+    connector: DataBaseClass, first_day: date
+) -> int:
+    return await connector.execute_named(
+        DROP_EXPIRED_REMINDERS_PARTITIONS, first_day, fetchval=True
+    )
+
+
+SET_PREMIUM: str = query_registry.register(
+    "set_premium",
+    """
+    Update "Users"
+    SET premium = True
+    WHERE user_id = $1
+    """,
+)
+
+
 # Изменим премиум-статус пользователя
 async def set_premium(connector: DataBaseClass, user_id: int):
-    command = """
-        Update "Users"
-        SET premium = True
-        WHERE user_id = $1
-        """
-    await connector.execute(command, user_id, execute=True)
+    await connector.execute_named(SET_PREMIUM, user_id, execute=True)
+
+
+CHECK_PREMIUM: str = query_registry.register(
+    "check_premium",
+    """
+    SELECT premium FROM "Users"
+    WHERE user_id = $1
+    """,
+)
 
 
 # Проверим премиум-статус пользователя
 async def check_premium(connector: DataBaseClass, user_id: int) -> Record:
-    command = """
-        SELECT premium FROM "Users"
-        WHERE user_id = $1
-        """
-    return await connector.execute(command, user_id, fetchrow=True)
+    return await connector.execute_named(CHECK_PREMIUM, user_id, fetchrow=True)
+
 
+GET_NUM_REMINDERS: str = query_registry.register(
+    "get_num_reminders",
+    """
+    SELECT num_reminders FROM "Users"
+    WHERE user_id = $1;
+    """,
+)
 
-# Получаем количество заметок
+
+# Получаем количество заметок (счетчик поддерживают триггеры, см. миграцию 3)
 async def get_num_reminders(connector: DataBaseClass, user_id: int) -> Record:
-    # Сначала обновим информацию о количестве, а после уже получим значение
-    command = """
-        UPDATE "Users"
-        SET num_reminders = (SELECT COUNT(*) FROM "Reminders" WHERE user_id = $1)
-        WHERE user_id = $1;
-        """
-    await connector.execute(command, user_id, execute=True)
-
-    command = """
-        SELECT num_reminders FROM "Users"
-        WHERE user_id = $1;
-        """
-    return await connector.execute(command, user_id, fetchrow=True)
+    return await connector.execute_named(GET_NUM_REMINDERS, user_id, fetchrow=True)
+
+
+GET_USER_LIMITS: str = query_registry.register(
+    "get_user_limits",
+    """
+    SELECT premium, num_reminders FROM "Users"
+    WHERE user_id = $1;
+    """,
+)
+
+
+# Получаем премиум-статус и количество заметок пользователя одним запросом.
+# None - пользователя еще нет в бд
+async def get_user_limits(connector: DataBaseClass, user_id: int) -> Record | None:
+    return await connector.execute_named(GET_USER_LIMITS, user_id, fetchrow=True)
+
+
+# Колонки таблицы fsm_sessions (см. миграцию 7) в порядке аргументов запроса
+FSM_SESSION_COLUMNS: Tuple[str, ...] = (
+    "storage_key",
+    "bot_id",
+    "chat_id",
+    "user_id",
+    "thread_id",
+    "business_connection_id",
+    "destiny",
+    "state",
+    "data",
+    "updated_at",
+)
+SAVE_FSM_SESSIONS: str = query_registry.register(
+    "save_fsm_sessions",
+    """
+    INSERT INTO fsm_sessions (
+        storage_key, bot_id, chat_id, user_id, thread_id,
+        business_connection_id, destiny, state, data, updated_at
+    )
+    SELECT * FROM unnest(
+        $1::text[], $2::bigint[], $3::bigint[], $4::bigint[], $5::bigint[],
+        $6::text[], $7::text[], $8::text[], $9::bytea[], $10::timestamp[]
+    )
+    ON CONFLICT (storage_key) DO UPDATE SET
+        state = EXCLUDED.state,
+        data = EXCLUDED.data,
+        updated_at = EXCLUDED.updated_at;
+    """,
+)
+
+
+# Сохраним (или обновим) состояния FSM одним запросом. Каждая сессия -
+# словарь с ключами из FSM_SESSION_COLUMNS
+async def save_fsm_sessions(
+    connector: DataBaseClass, sessions: List[Mapping[str, Any]]
+):
+    if not sessions:
+        return
+
+    await connector.execute_named(
+        SAVE_FSM_SESSIONS,
+        *[[session[column] for session in sessions] for column in FSM_SESSION_COLUMNS],
+        execute=True,
+    )
+
+
+DELETE_FSM_SESSIONS: str = query_registry.register(
+    "delete_fsm_sessions",
+    """
+    DELETE FROM fsm_sessions
+    WHERE storage_key = ANY($1::text[]);
+    """,
+)
+
+
+# Удалим состояния FSM, которые закончились или были вытеснены из памяти
+async def delete_fsm_sessions(connector: DataBaseClass, storage_keys: List[str]):
+    if not storage_keys:
+        return
+
+    await connector.execute_named(DELETE_FSM_SESSIONS, storage_keys, execute=True)
+
+
+DELETE_EXPIRED_FSM_SESSIONS: str = query_registry.register(
+    "delete_expired_fsm_sessions",
+    """
+    WITH deleted AS (
+        DELETE FROM fsm_sessions
+        WHERE updated_at < $1
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM deleted;
+    """,
+)
+
+
+# Удалим состояния FSM, которые не менялись с before. Возвращает количество
+# удаленных состояний
+async def delete_expired_fsm_sessions(
+    connector: DataBaseClass, before: datetime
+) -> int:
+    return await connector.execute_named(
+        DELETE_EXPIRED_FSM_SESSIONS, before, fetchval=True
+    )
+
+
+LOAD_FSM_SESSIONS: str = query_registry.register(
+    "load_fsm_sessions",
+    """
+    SELECT * FROM fsm_sessions
+    WHERE updated_at >= $1
+    ORDER BY updated_at DESC
+    LIMIT $2;
+    """,
+)
+
+
+# Достанем не больше limit последних измененных состояний FSM, которые
+# менялись не раньше since
+async def load_fsm_sessions(
+    connector: DataBaseClass, since: datetime, limit: int
+) -> List[Record]:
+    return await connector.execute_named(LOAD_FSM_SESSIONS, since, limit, fetch=True)
@@ -0,0 +1,453 @@
+"""
+Модуль с версионными миграциями схемы базы данных.
+
+Каждая миграция - это номер версии, описание и SQL, который ее выполняет.
+Номер последней примененной версии хранится в таблице schema_version,
+поэтому при запуске бота применяются только новые миграции, а если схема
+актуальна, выполняется один SELECT. Одновременный запуск нескольких
+процессов бота сериализуется advisory-блокировкой.
+"""
+
+import logging
+from typing import List, NamedTuple
+
+from asyncpg import Connection
+
+# Ключ advisory-блокировки, под которой применяются миграции
+MIGRATIONS_LOCK_KEY: int = 7301
+# Ключ advisory-блокировки, под которой создаются и удаляются секции Reminders
+# (используется в SQL миграции 4)
+PARTITIONS_LOCK_KEY: int = 7302
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    sql: str
+
+
+MIGRATIONS: List[Migration] = [
+    # Схема, которую раньше создавал Base.metadata.create_all (см. models.py).
+    # Для уже существующих баз данных ничего не меняет
+    Migration(
+        version=1,
+        description="initial schema",
+        sql="""
+            CREATE TABLE IF NOT EXISTS "Users" (
+                user_id SERIAL PRIMARY KEY,
+                premium BOOLEAN NOT NULL,
+                num_reminders INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS "Reminders" (
+                reminder_id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES "Users" (user_id),
+                reminder_date DATE NOT NULL,
+                reminder_time TIME WITHOUT TIME ZONE NOT NULL,
+                reminder_text TEXT,
+                last_reminder BOOLEAN NOT NULL,
+                file_id TEXT,
+                file_unique_id TEXT,
+                msg_type TEXT NOT NULL
+            );
+            """,
+    ),
+    # Индексы под запросы из methods.py:
+    # - заметки пользователя на дату / все заметки пользователя по порядку
+    #   (select_reminders, show_all_reminders, постраничный просмотр);
+    # - заметки всех пользователей на день по времени (get_today_reminders)
+    #   и удаление прошедших заметок (delete_irrelevant_reminders)
+    Migration(
+        version=2,
+        description="reminders indexes",
+        sql="""
+            CREATE INDEX IF NOT EXISTS ix_reminders_user_date_time
+                ON "Reminders" (user_id, reminder_date, reminder_time, reminder_id);
+
+            CREATE INDEX IF NOT EXISTS ix_reminders_date_time
+                ON "Reminders" (reminder_date, reminder_time);
+
+            ANALYZE "Reminders";
+            """,
+    ),
+    # Счетчик заметок пользователя (Users.num_reminders) поддерживается
+    # триггерами при добавлении и удалении заметок, поэтому проверка лимита
+    # читает одну строку Users по первичному ключу вместо COUNT(*).
+    # Триггеры уровня оператора с таблицами переходов обновляют каждого
+    # пользователя один раз на оператор, даже при пакетном удалении
+    Migration(
+        version=3,
+        description="num_reminders counter triggers",
+        sql="""
+            CREATE OR REPLACE FUNCTION reminders_count_inserted() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                UPDATE "Users" AS users
+                SET num_reminders = users.num_reminders + inserted.count
+                FROM (
+                    SELECT user_id, COUNT(*) AS count
+                    FROM new_reminders
+                    GROUP BY user_id
+                ) AS inserted
+                WHERE users.user_id = inserted.user_id;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION reminders_count_deleted() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                UPDATE "Users" AS users
+                SET num_reminders = GREATEST(users.num_reminders - deleted.count, 0)
+                FROM (
+                    SELECT user_id, COUNT(*) AS count
+                    FROM old_reminders
+                    GROUP BY user_id
+                ) AS deleted
+                WHERE users.user_id = deleted.user_id;
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP TRIGGER IF EXISTS reminders_count_insert ON "Reminders";
+            CREATE TRIGGER reminders_count_insert
+                AFTER INSERT ON "Reminders"
+                REFERENCING NEW TABLE AS new_reminders
+                FOR EACH STATEMENT EXECUTE FUNCTION reminders_count_inserted();
+
+            DROP TRIGGER IF EXISTS reminders_count_delete ON "Reminders";
+            CREATE TRIGGER reminders_count_delete
+                AFTER DELETE ON "Reminders"
+                REFERENCING OLD TABLE AS old_reminders
+                FOR EACH STATEMENT EXECUTE FUNCTION reminders_count_deleted();
+
+            -- Пересчитаем счетчики для уже существующих заметок
+            LOCK TABLE "Reminders" IN SHARE MODE;
+            UPDATE "Users" AS users
+            SET num_reminders = COALESCE(
+                (SELECT COUNT(*) FROM "Reminders" WHERE user_id = users.user_id), 0
+            );
+            """,
+    ),
+    # Таблица Reminders секционируется по reminder_date: по секции на день
+    # (Reminders_ГГГГММДД) на несколько дней вперед и секция по умолчанию для
+    # всех остальных дат. Заметки на день читаются из одной секции, а прошедшие
+    # дни удаляются целиком (DROP секции) вместо построчного DELETE.
+    # Секциями управляют функции reminders_ensure_partitions и
+    # reminders_drop_expired_partitions (см. services/partitions.py). Их
+    # вызывает каждый процесс отправки, поэтому они выполняются по очереди
+    # под advisory-блокировкой PARTITIONS_LOCK_KEY (до конца транзакции):
+    # иначе два процесса могли бы одновременно создавать одну и ту же секцию
+    Migration(
+        version=4,
+        description="partition reminders by date",
+        sql="""
+            LOCK TABLE "Reminders" IN ACCESS EXCLUSIVE MODE;
+
+            ALTER TABLE "Reminders" RENAME TO "Reminders_old";
+            DROP INDEX IF EXISTS ix_reminders_user_date_time;
+            DROP INDEX IF EXISTS ix_reminders_date_time;
+            DROP TRIGGER IF EXISTS reminders_count_insert ON "Reminders_old";
+            DROP TRIGGER IF EXISTS reminders_count_delete ON "Reminders_old";
+
+            -- Ключ секционирования должен входить в первичный ключ. reminder_id
+            -- по-прежнему уникален: его выдает одна последовательность
+            CREATE TABLE "Reminders" (
+                reminder_id INTEGER NOT NULL
+                    DEFAULT nextval('"Reminders_reminder_id_seq"'),
+                user_id INTEGER REFERENCES "Users" (user_id),
+                reminder_date DATE NOT NULL,
+                reminder_time TIME WITHOUT TIME ZONE NOT NULL,
+                reminder_text TEXT,
+                last_reminder BOOLEAN NOT NULL,
+                file_id TEXT,
+                file_unique_id TEXT,
+                msg_type TEXT NOT NULL,
+                CONSTRAINT reminders_pk PRIMARY KEY (reminder_id, reminder_date)
+            ) PARTITION BY RANGE (reminder_date);
+            ALTER SEQUENCE "Reminders_reminder_id_seq"
+                OWNED BY "Reminders".reminder_id;
+
+            CREATE TABLE "Reminders_default" PARTITION OF "Reminders" DEFAULT;
+
+            CREATE INDEX ix_reminders_user_date_time
+                ON "Reminders" (user_id, reminder_date, reminder_time, reminder_id);
+            CREATE INDEX ix_reminders_date_time
+                ON "Reminders" (reminder_date, reminder_time);
+
+            -- Создадим секции на дни [first_day, first_day + days_ahead].
+            -- Заметки на эти дни переносятся в новую секцию из секции по
+            -- умолчанию (в обход триггеров счетчика - количество не меняется)
+            CREATE OR REPLACE FUNCTION reminders_ensure_partitions(
+                first_day DATE, days_ahead INTEGER
+            ) RETURNS INTEGER
+            LANGUAGE plpgsql AS $$
+            DECLARE
+                day DATE;
+                partition_name TEXT;
+                created INTEGER := 0;
+            BEGIN
+                -- 7302 - PARTITIONS_LOCK_KEY
+                PERFORM pg_advisory_xact_lock(7302);
+                FOR day IN
+                    SELECT generate_series(
+                        first_day, first_day + days_ahead, interval '1 day'
+                    )::date
+                LOOP
+                    partition_name := 'Reminders_' || to_char(day, 'YYYYMMDD');
+                    IF to_regclass(format('%I', partition_name)) IS NOT NULL THEN
+                        CONTINUE;
+                    END IF;
+
+                    EXECUTE format(
+                        'CREATE TABLE %I (LIKE "Reminders" INCLUDING DEFAULTS,'
+                        ' CHECK (reminder_date >= %L AND reminder_date < %L))',
+                        partition_name, day, day + 1
+                    );
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM "Reminders_default"'
+                        ' WHERE reminder_date = %L RETURNING *)'
+                        ' INSERT INTO %I SELECT * FROM moved',
+                        day, partition_name
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE "Reminders" ATTACH PARTITION %I'
+                        ' FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, day, day + 1
+                    );
+                    created := created + 1;
+                END LOOP;
+                RETURN created;
+            END;
+            $$;
+
+            -- Удалим секции дней до first_day (и такие заметки в секции по
+            -- умолчанию). Перед удалением секции уменьшим счетчики заметок
+            -- ее владельцев: DROP не вызывает триггеры
+            CREATE OR REPLACE FUNCTION reminders_drop_expired_partitions(
+                first_day DATE
+            ) RETURNS INTEGER
+            LANGUAGE plpgsql AS $$
+            DECLARE
+                partition_name TEXT;
+                dropped INTEGER := 0;
+            BEGIN
+                -- 7302 - PARTITIONS_LOCK_KEY
+                PERFORM pg_advisory_xact_lock(7302);
+                FOR partition_name IN
+                    SELECT child.relname
+                    FROM pg_inherits
+                    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+                    WHERE pg_inherits.inhparent = '"Reminders"'::regclass
+                        AND child.relname ~ '^Reminders_[0-9]{8}$'
+                        AND to_date(substring(child.relname FROM 11), 'YYYYMMDD')
+                            < first_day
+                LOOP
+                    EXECUTE format(
+                        'UPDATE "Users" AS users'
+                        ' SET num_reminders ='
+                        ' GREATEST(users.num_reminders - expired.count, 0)'
+                        ' FROM (SELECT user_id, COUNT(*) AS count FROM %I'
+                        ' GROUP BY user_id) AS expired'
+                        ' WHERE users.user_id = expired.user_id',
+                        partition_name
+                    );
+                    EXECUTE format('DROP TABLE %I', partition_name);
+                    dropped := dropped + 1;
+                END LOOP;
+
+                DELETE FROM "Reminders" WHERE reminder_date < first_day;
+                RETURN dropped;
+            END;
+            $$;
+
+            -- Перенесем заметки: сегодняшние и будущие дни получат свои секции,
+            -- остальное попадет в секцию по умолчанию. Триггеры счетчика
+            -- создаются после переноса, поэтому счетчики не меняются
+            SELECT reminders_ensure_partitions(current_date, 14);
+            INSERT INTO "Reminders" (
+                reminder_id, user_id, reminder_date, reminder_time, reminder_text,
+                last_reminder, file_id, file_unique_id, msg_type
+            )
+            SELECT
+                reminder_id, user_id, reminder_date, reminder_time, reminder_text,
+                last_reminder, file_id, file_unique_id, msg_type
+            FROM "Reminders_old";
+            DROP TABLE "Reminders_old";
+
+            CREATE TRIGGER reminders_count_insert
+                AFTER INSERT ON "Reminders"
+                REFERENCING NEW TABLE AS new_reminders
+                FOR EACH STATEMENT EXECUTE FUNCTION reminders_count_inserted();
+
+            CREATE TRIGGER reminders_count_delete
+                AFTER DELETE ON "Reminders"
+                REFERENCING OLD TABLE AS old_reminders
+                FOR EACH STATEMENT EXECUTE FUNCTION reminders_count_deleted();
+
+            ANALYZE "Reminders";
+            """,
+    ),
+    # Аренда заметок процессами бота: процесс, который загрузил заметку в свое
+    # расписание, записывает себя в claimed_by и продлевает claimed_until,
+    # пока заметка не отправлена. Заметки с истекшей арендой (процесс упал)
+    # забирает другой процесс
+    Migration(
+        version=5,
+        description="reminders claims",
+        sql="""
+            ALTER TABLE "Reminders"
+                ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+                ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP WITHOUT TIME ZONE;
+            """,
+    ),
+    # Уведомления об изменении заметок (канал reminders_changed): каждый
+    # процесс бота обновляет по ним свое расписание. Изменение только аренды
+    # (claimed_by, claimed_until) уведомлений не вызывает. Перенос заметки
+    # на другой день (в другую секцию) приходит как DELETE и INSERT
+    Migration(
+        version=6,
+        description="reminders change notifications",
+        sql="""
+            CREATE OR REPLACE FUNCTION reminders_notify_change()
+            RETURNS TRIGGER LANGUAGE plpgsql AS $$
+            DECLARE
+                reminder RECORD;
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    reminder := OLD;
+                ELSE
+                    reminder := NEW;
+                END IF;
+
+                PERFORM pg_notify(
+                    'reminders_changed',
+                    json_build_object(
+                        'op', TG_OP,
+                        'reminder_id', reminder.reminder_id,
+                        'reminder_date', reminder.reminder_date,
+                        'reminder_time', reminder.reminder_time
+                    )::text
+                );
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP TRIGGER IF EXISTS reminders_notify_insert_delete ON "Reminders";
+            CREATE TRIGGER reminders_notify_insert_delete
+                AFTER INSERT OR DELETE ON "Reminders"
+                FOR EACH ROW EXECUTE FUNCTION reminders_notify_change();
+
+            DROP TRIGGER IF EXISTS reminders_notify_update ON "Reminders";
+            CREATE TRIGGER reminders_notify_update
+                AFTER UPDATE OF
+                    reminder_date, reminder_time, reminder_text,
+                    file_id, file_unique_id, msg_type
+                ON "Reminders"
+                FOR EACH ROW EXECUTE FUNCTION reminders_notify_change();
+            """,
+    ),
+    # Состояния FSM пользователей (см. DurableMemoryStorage в
+    # utils/fsm_storage.py), чтобы начатые диалоги переживали перезапуск бота.
+    # storage_key собран из остальных полей ключа, data - pickle словаря
+    Migration(
+        version=7,
+        description="fsm sessions",
+        sql="""
+            CREATE TABLE IF NOT EXISTS fsm_sessions (
+                storage_key TEXT PRIMARY KEY,
+                bot_id BIGINT NOT NULL,
+                chat_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                thread_id BIGINT,
+                business_connection_id TEXT,
+                destiny TEXT NOT NULL,
+                state TEXT,
+                data BYTEA NOT NULL,
+                updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS fsm_sessions_updated_at_idx
+                ON fsm_sessions (updated_at);
+            """,
+    ),
+    # Уведомления об изменении премиум-статуса и счетчика заметок
+    # пользователя (канал user_limits_changed, в уведомлении - user_id).
+    # Счетчик меняют и процессы отправки (удаление отправленных заметок,
+    # удаление секций прошедших дней), поэтому процесс, который обрабатывает
+    # апдейты, сбрасывает по ним свой кэш лимитов (см. UserLimitsListener)
+    Migration(
+        version=8,
+        description="user limits change notifications",
+        sql="""
+            CREATE OR REPLACE FUNCTION users_notify_limits_change()
+            RETURNS TRIGGER LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_notify('user_limits_changed', NEW.user_id::text);
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP TRIGGER IF EXISTS users_notify_limits_update ON "Users";
+            CREATE TRIGGER users_notify_limits_update
+                AFTER UPDATE OF premium, num_reminders ON "Users"
+                FOR EACH ROW
+                WHEN (
+                    OLD.premium IS DISTINCT FROM NEW.premium
+                    OR OLD.num_reminders IS DISTINCT FROM NEW.num_reminders
+                )
+                EXECUTE FUNCTION users_notify_limits_change();
+            """,
+    ),
+]
+
+
+# Применим все миграции, которые еще не были применены
+async def apply_migrations(
+    connection: Connection, migrations: List[Migration] = MIGRATIONS
+):
+    await connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    )
+
+    # Если схема актуальна - больше ничего не делаем
+    current_version: int = await _get_schema_version(connection)
+    if current_version >= migrations[-1].version:
+        logging.info("Database schema is up to date (version %d)", current_version)
+        return
+
+    await connection.execute("SELECT pg_advisory_lock($1);", MIGRATIONS_LOCK_KEY)
+    try:
+        # Пока ждали блокировку, миграции мог применить другой процесс
+        current_version = await _get_schema_version(connection)
+
+        for migration in migrations:
+            if migration.version <= current_version:
+                continue
+
+            logging.info(
+                "Apply migration %d: %s", migration.version, migration.description
+            )
+            async with connection.transaction():
+                await connection.execute(migration.sql)
+                await connection.execute(
+                    """
+                    INSERT INTO schema_version (version, description)
+                    VALUES($1, $2);
+                    """,
+                    migration.version,
+                    migration.description,
+                )
+    finally:
+        await connection.execute("SELECT pg_advisory_unlock($1);", MIGRATIONS_LOCK_KEY)
+
+
+async def _get_schema_version(connection: Connection) -> int:
+    return await connection.fetchval(
+        "SELECT COALESCE(MAX(version), 0) FROM schema_version;"
+    )
@@ -1,7 +1,7 @@
-from datetime import date, time
+from datetime import date, datetime, time
 from typing import Optional
 
-from sqlalchemy import Boolean, Date, ForeignKey, Integer, Text, Time
+from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Index, Integer, Text, Time
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .database import Base
@@ -15,17 +15,37 @@ class User(Base):
     num_reminders: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
 
+# Схема создается и изменяется миграциями из migrations.py,
+# модели описывают ее итоговое состояние.
+# Таблица секционирована по reminder_date (по секции на день), поэтому
+# reminder_date входит в первичный ключ
 class Reminders(Base):
     __tablename__ = "Reminders"
+    __table_args__ = (
+        Index(
+            "ix_reminders_user_date_time",
+            "user_id",
+            "reminder_date",
+            "reminder_time",
+            "reminder_id",
+        ),
+        Index("ix_reminders_date_time", "reminder_date", "reminder_time"),
+        {"postgresql_partition_by": "RANGE (reminder_date)"},
+    )
 
     reminder_id: Mapped[int] = mapped_column(
         Integer, primary_key=True, autoincrement=True
     )
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("Users.user_id"))
-    reminder_date: Mapped[date] = mapped_column(Date, nullable=False)
+    reminder_date: Mapped[date] = mapped_column(Date, primary_key=True)
     reminder_time: Mapped[time] = mapped_column(Time, nullable=False)
     reminder_text: Mapped[str] = mapped_column(Text)
     last_reminder: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     file_id: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)
     file_unique_id: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)
     msg_type: Mapped[str] = mapped_column(Text, nullable=False, default="text")
+    # Процесс бота, который арендовал заметку для отправки, и срок аренды
+    claimed_by: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)
+    claimed_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, nullable=True, default=None
+    )
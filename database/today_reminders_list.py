@@ -1,102 +1,336 @@
 """
-Модуль, в котором хранится класс для хранения списка напоминаний на сегодня
+Модуль, в котором хранится класс для хранения списка ближайших напоминаний.
+
+В памяти держатся только заметки, время отправки которых раньше конца окна
+(window_end). Окно регулярно сдвигается и дозагружается из бд
+(см. services/get_today_list_reminders.py).
+
+Процессов бота может быть несколько: каждый держит в расписании только
+заметки, которые взял в аренду (claimed_by в бд), и продлевает аренду,
+пока заметка не отправлена и не удалена.
 """
 
-from datetime import date, datetime, time
-from typing import List
+import asyncio
+import heapq
 import logging
+import os
+import socket
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-from aiogram import Bot
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from asyncpg import Record
-from asyncpg.pool import Pool
 
-from database import DataBaseClass, delete_reminder
+
+# Максимальное время сна диспетчера (в секундах). Нужно, чтобы диспетчер
+# не проспал отправку, если системное время было переведено
+MAX_DISPATCHER_SLEEP: float = 60.0
+# На сколько берется (и продлевается) аренда заметки. Если процесс упал,
+# его заметки заберут другие процессы не позже, чем через это время
+CLAIM_LEASE: timedelta = timedelta(minutes=3)
 
 
 class TodayRemindersClass:
-    def __init__(self, scheduler: AsyncIOScheduler, bot: Bot, pool: Pool):
-        self.scheduler: AsyncIOScheduler = scheduler
-        self.bot: Bot = bot
-        self.pool: Pool = pool
+    def __init__(self, owner: str | None = None, claim_lease: timedelta = CLAIM_LEASE):
+        # Имя процесса, под которым он арендует заметки
+        self.owner: str = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.claim_lease: timedelta = claim_lease
+
+        # reminder_id -> (время отправки, заметка)
+        self.today_reminders: Dict[int, Tuple[datetime, Record]] = {}
+        # Куча (время отправки, reminder_id), упорядоченная по времени отправки.
+        # Удаленные заметки из кучи не вычищаются сразу, а пропускаются при чтении
+        self._queue: List[Tuple[datetime, int]] = []
+        # user_id -> множество reminder_id заметок пользователя
+        self._users_reminders: Dict[int, Set[int]] = {}
+        # id заметок, которые уже переданы на отправку, но еще не удалены из бд
+        self._in_flight: Set[int] = set()
+
+        # Конец окна: заметки с более поздним временем отправки не хранятся,
+        # их выгрузит из бд одна из следующих загрузок. None - окно не загружено
+        self.window_end: Optional[datetime] = None
+        # id заметок, которые изменились, пока шел запрос загрузки окна.
+        # Результат запроса для них мог устареть, поэтому он пропускается
+        self._loading: bool = False
+        self._changed_during_load: Set[int] = set()
+
+        # Диспетчер, который спит до ближайшей заметки и передает на отправку
+        # все заметки, время которых наступило
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._send: Optional[Callable[[Record], Awaitable[None]]] = None
+
+    def __len__(self) -> int:
+        return len(self.today_reminders)
 
-        self.today_reminders: List[Record] = []
+    def __contains__(self, reminder_id: int) -> bool:
+        return reminder_id in self.today_reminders
+
+    # Добавляем заметки в список запланированных сообщений
+    def push(self, reminders: Iterable[Record]):
+        new_items: List[Tuple[datetime, int]] = []
 
-    # Добавляем заметку в список запланированных сообщений
-    def push(self, reminders: List[Record]):
         for reminder in reminders:
+            reminder_id: int = reminder["reminder_id"]
+            # Проверим, что такой заметки пока не запланировано (или она
+            # не отправляется прямо сейчас)
+            if reminder_id in self.today_reminders or reminder_id in self._in_flight:
+                continue
 
-            # Проверим, что такой заметки пока не запланировано
-            is_reminder_in_today_list: bool = False
-            for reminder_from_list in self.today_reminders:
-                if reminder_from_list["reminder_id"] == reminder["reminder_id"]:
-                    is_reminder_in_today_list = True
-
-            if not is_reminder_in_today_list:
-                # Добавляем заметку в хранилище
-                self.today_reminders.append(reminder)
-                # Планируем отправление сообщения
-                self._planning_send_reminder(reminder=reminder)
-
-    def delete(self, reminder: Record):
-        index: int = 0
-
-        for reminder_from_list in self.today_reminders:
-            if reminder_from_list["reminder_id"] == reminder["reminder_id"]:
-                # Удаляем запланированное сообщение
-                self.scheduler.remove_job(str(reminder["reminder_id"]))
-                # Удаляем id из списка запланированных сообщений
-                self.today_reminders.pop(index)
-                break
-            else:
-                index += 1
+            run_date: datetime = self._create_full_datetime(
+                r_date=reminder["reminder_date"], r_time=reminder["reminder_time"]
+            )
+            # Заметку за пределами окна выгрузит следующая загрузка
+            if not self._in_window(run_date):
+                continue
+            # Добавляем заметку в хранилище и индексы
+            self.today_reminders[reminder_id] = (run_date, reminder)
+            self._users_reminders.setdefault(reminder["user_id"], set()).add(
+                reminder_id
+            )
+            new_items.append((run_date, reminder_id))
+
+        # Большую пачку (например, при загрузке окна) дешевле добавить
+        # целиком и перестроить кучу за O(n), чем вставлять по одной
+        if len(new_items) > len(self._queue):
+            self._queue.extend(new_items)
+            heapq.heapify(self._queue)
+        else:
+            for item in new_items:
+                heapq.heappush(self._queue, item)
+
+        # Будим диспетчер: новая заметка могла оказаться ближайшей
+        if new_items:
+            self._wakeup.set()
+
+    # Удаляем заметку (или заметку по ее id) из списка запланированных сообщений
+    def delete(self, reminder: Record | int):
+        reminder_id: int = (
+            reminder if isinstance(reminder, int) else reminder["reminder_id"]
+        )
+
+        self._mark_changed((reminder_id,))
+        self._remove(reminder_id)
+
+    # Обновляем заметку после ее изменения в бд. Если время отправки
+    # не изменилось, заменяется только сама заметка (например, ее текст),
+    # иначе в кучу добавляется запись с новым временем, а старая будет
+    # пропущена при чтении. Заметка за пределами окна из расписания убирается
+    def reschedule(self, reminder: Record):
+        reminder_id: int = reminder["reminder_id"]
+        self._mark_changed((reminder_id,))
+        run_date: datetime = self._create_full_datetime(
+            r_date=reminder["reminder_date"], r_time=reminder["reminder_time"]
+        )
+        if not self._in_window(run_date):
+            self._remove(reminder_id)
+            return
+
+        item: Optional[Tuple[datetime, Record]] = self.today_reminders.get(reminder_id)
+        if item is None:
+            self.push([reminder])
+            return
+
+        self.today_reminders[reminder_id] = (run_date, reminder)
+        if run_date != item[0]:
+            heapq.heappush(self._queue, (run_date, reminder_id))
+            # Будим диспетчер: заметка могла стать ближайшей
+            self._wakeup.set()
+
+    # Попадает ли заметка с такими датой и временем в окно расписания
+    def in_window(self, r_date: date, r_time: time) -> bool:
+        return self._in_window(self._create_full_datetime(r_date=r_date, r_time=r_time))
+
+    # Убираем из расписания сразу несколько заметок (куча перестраивается
+    # не больше одного раза). Возвращаем количество убранных заметок
+    def delete_many(self, reminder_ids: Iterable[int]) -> int:
+        reminder_ids = list(reminder_ids)
+        self._mark_changed(reminder_ids)
+        removed: int = 0
+        for reminder_id in reminder_ids:
+            if self._remove(reminder_id, compact=False) is not None:
+                removed += 1
+
+        self._compact()
+        return removed
+
+    # Получаем запланированную заметку по ее id
+    def get(self, reminder_id: int) -> Optional[Record]:
+        item: Optional[Tuple[datetime, Record]] = self.today_reminders.get(reminder_id)
+        return None if item is None else item[1]
+
+    # Получаем все запланированные заметки пользователя
+    def get_user_reminders(self, user_id: int) -> List[Record]:
+        return [
+            self.today_reminders[reminder_id][1]
+            for reminder_id in self._users_reminders.get(user_id, ())
+        ]
+
+    # Время отправки ближайшей заметки (None, если заметок нет)
+    def next_run_date(self) -> Optional[datetime]:
+        self._drop_stale_head()
+        return self._queue[0][0] if self._queue else None
+
+    # id всех арендованных процессом заметок (запланированных и отправляемых)
+    def claimed_ids(self) -> List[int]:
+        return [*self.today_reminders, *self._in_flight]
+
+    # Отмечаем заметки, переданные на отправку в обход расписания (например,
+    # пропущенные во время простоя), чтобы их аренда продлевалась
+    def add_in_flight(self, reminder_ids: Iterable[int]):
+        self._in_flight.update(reminder_ids)
+
+    # Отмечаем, что заметки обработаны и удалены из бд
+    def finish(self, reminder_ids: Iterable[int]):
+        reminder_ids = list(reminder_ids)
+        self._mark_changed(reminder_ids)
+        self._in_flight.difference_update(reminder_ids)
+
+    # Начинаем загрузку окна из бд (вызывается перед запросом)
+    def begin_load(self):
+        self._loading = True
+        self._changed_during_load.clear()
+
+    # Заканчиваем загрузку: сдвигаем конец окна и добавляем заметки из бд,
+    # кроме тех, что изменились (удалены, отправлены, перенесены) во время
+    # запроса
+    def finish_load(self, reminders: Iterable[Record], window_end: datetime):
+        self.window_end = window_end
+        self._loading = False
+        changed: Set[int] = self._changed_during_load
+        self._changed_during_load = set()
+        self.push(
+            reminder for reminder in reminders if reminder["reminder_id"] not in changed
+        )
+
+    # Запрос загрузки окна не удался: окно остается прежним
+    def cancel_load(self):
+        self._loading = False
+        self._changed_during_load.clear()
+
+    # Запускаем диспетчер (нужен запущенный event loop). Заметки, время которых
+    # наступило, передаются в send (например, в очередь доставки)
+    def start(self, send: Callable[[Record], Awaitable[None]]):
+        self._send = send
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
 
     def print(self):
-        for reminder in self.today_reminders:
+        for _, reminder in sorted(
+            self.today_reminders.values(), key=lambda item: item[0]
+        ):
             print(reminder)
 
     def clear(self):
         self.today_reminders.clear()
+        self._queue.clear()
+        self._users_reminders.clear()
+        self._in_flight.clear()
+
+    def _in_window(self, run_date: datetime) -> bool:
+        return self.window_end is None or run_date < self.window_end
+
+    def _mark_changed(self, reminder_ids: Iterable[int]):
+        if self._loading:
+            self._changed_during_load.update(reminder_ids)
+
+    # Убираем заметку из хранилища и индексов. Возвращаем удаленную заметку
+    def _remove(self, reminder_id: int, compact: bool = True) -> Optional[Record]:
+        item: Optional[Tuple[datetime, Record]] = self.today_reminders.pop(
+            reminder_id, None
+        )
+        if item is None:
+            return None
+
+        reminder: Record = item[1]
+        user_reminders: Optional[Set[int]] = self._users_reminders.get(
+            reminder["user_id"]
+        )
+        if user_reminders is not None:
+            user_reminders.discard(reminder_id)
+            if not user_reminders:
+                del self._users_reminders[reminder["user_id"]]
 
-    async def _send_appropriate_reminder(self, reminder: Record):
-        logging.info("Start sending reminder")
-        reminder_type: str = reminder["msg_type"]
-        user_id: int = reminder["user_id"]
-        file_id: str = reminder["file_id"]
-        reminder_text: str = reminder["reminder_text"]
-
-        # Отправляем сообщение пользователю
-        if reminder_type == "text":
-            await self.bot.send_message(user_id, reminder_text)
-        elif reminder_type == "photo":
-            await self.bot.send_photo(user_id, photo=file_id, caption=reminder_text)
-        elif reminder_type == "video":
-            await self.bot.send_video(user_id, video=file_id, caption=reminder_text)
-        elif reminder_type == "audio":
-            await self.bot.send_audio(user_id, audio=file_id, caption=reminder_text)
-        elif reminder_type == "document":
-            await self.bot.send_document(
-                user_id, document=file_id, caption=reminder_text
+        if compact:
+            self._compact()
+        return reminder
+
+    # Если устаревших записей в куче стало больше половины - перестроим ее
+    def _compact(self):
+        if len(self._queue) > 2 * len(self.today_reminders) + 64:
+            self._queue = [
+                (run_date, r_id) for r_id, (run_date, _) in self.today_reminders.items()
+            ]
+            heapq.heapify(self._queue)
+
+    # Убираем из вершины кучи записи об уже удаленных или перенесенных заметках
+    def _drop_stale_head(self):
+        while self._queue:
+            run_date, reminder_id = self._queue[0]
+            item: Optional[Tuple[datetime, Record]] = self.today_reminders.get(
+                reminder_id
             )
-        elif reminder_type == "voice":
-            await self.bot.send_voice(user_id, voice=file_id)
-        elif reminder_type == "video_note":
-            await self.bot.send_video_note(user_id, video_note=file_id)
-
-        # Удаляем напоминание из бд
-        async with self.pool.acquire() as connection:
-            database: DataBaseClass = DataBaseClass(connection)
-            await delete_reminder(database, reminder["reminder_id"])
-
-        # Удаляем напоминание из хранилища задач
-        index: int = 0
-
-        for reminder_from_list in self.today_reminders:
-            if reminder_from_list["reminder_id"] == reminder["reminder_id"]:
-                self.today_reminders.pop(index)
+            if item is not None and item[0] == run_date:
                 break
-            else:
-                index += 1
+            heapq.heappop(self._queue)
+
+    # Забираем из хранилища все заметки, время отправки которых уже наступило
+    def _pop_due(self, now: datetime) -> List[Record]:
+        due_reminders: List[Record] = []
+
+        while True:
+            self._drop_stale_head()
+            if not self._queue or self._queue[0][0] > now:
+                break
+
+            _, reminder_id = heapq.heappop(self._queue)
+            reminder: Optional[Record] = self._remove(reminder_id)
+            if reminder is not None:
+                self._in_flight.add(reminder_id)
+                due_reminders.append(reminder)
+
+        return due_reminders
+
+    # Цикл диспетчера: спим до ближайшей заметки (или до добавления новой),
+    # после передаем на отправку все заметки, время которых наступило
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+
+            for reminder in self._pop_due(datetime.now()):
+                # Ошибка при передаче одной заметки не должна останавливать
+                # диспетчер. Заметку перестаем считать отправляемой: ее аренда
+                # не продлится, и после окончания аренды ее снова загрузят
+                try:
+                    await self._send(reminder)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logging.exception(
+                        "Failed to dispatch reminder %s", str(reminder["reminder_id"])
+                    )
+                    self._in_flight.discard(reminder["reminder_id"])
+
+            next_run_date: Optional[datetime] = self.next_run_date()
+            timeout: float = MAX_DISPATCHER_SLEEP
+            if next_run_date is not None:
+                timeout = min(
+                    max((next_run_date - datetime.now()).total_seconds(), 0),
+                    MAX_DISPATCHER_SLEEP,
+                )
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
     @staticmethod
     def _create_full_datetime(r_date: date, r_time: time):
@@ -107,15 +341,3 @@ class TodayRemindersClass:
             hour=r_time.hour,
             minute=r_time.minute,
         )
-
-    def _planning_send_reminder(self, reminder: Record):
-        logging.debug("reminder_id is %s", str(reminder["reminder_id"]))
-        self.scheduler.add_job(
-            self._send_appropriate_reminder,
-            trigger="date",
-            id=str(reminder["reminder_id"]),
-            run_date=self._create_full_datetime(
-                r_date=reminder["reminder_date"], r_time=reminder["reminder_time"]
-            ),
-            kwargs={"reminder": reminder},
-        )
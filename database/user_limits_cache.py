@@ -0,0 +1,120 @@
+"""
+Модуль, в котором хранится кэш премиум-статуса и количества заметок
+пользователей.
+
+Эти данные нужны мидлвари RemindersLimits на каждое сообщение, а меняются
+редко: при оплате премиума и при добавлении или удалении заметок. Кэш
+ограничен по размеру (вытесняются давно не использованные записи) и по
+времени жизни записи, а при изменениях записи обновляются или удаляются.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Tuple
+
+from asyncpg import Record
+
+from .connection_pool import DataBaseClass
+from .methods import get_user_limits
+
+# Максимальное количество пользователей в кэше
+MAX_SIZE: int = 10000
+# Время жизни записи (в секундах)
+TTL: float = 300.0
+
+
+class UserLimits(NamedTuple):
+    premium: bool
+    num_reminders: int
+
+
+class UserLimitsCacheClass:
+    def __init__(self, max_size: int = MAX_SIZE, ttl: float = TTL):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+
+        # user_id -> (время истечения записи, данные пользователя)
+        self._entries: OrderedDict[int, Tuple[float, UserLimits]] = OrderedDict()
+        # Увеличивается при каждом изменении. Если во время запроса к бд данные
+        # изменились, результат запроса в кэш не попадет
+        self._generation: int = 0
+
+        # Статистика
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Получаем премиум-статус и количество заметок пользователя.
+    # None - пользователя еще нет в бд (такой результат не кэшируется)
+    async def get(self, database: DataBaseClass, user_id: int) -> UserLimits | None:
+        entry: Tuple[float, UserLimits] | None = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._hits += 1
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+        self._misses += 1
+        generation: int = self._generation
+        record: Record | None = await get_user_limits(
+            connector=database, user_id=user_id
+        )
+        if record is None:
+            self._entries.pop(user_id, None)
+            return None
+
+        user_limits: UserLimits = UserLimits(
+            premium=record["premium"], num_reminders=record["num_reminders"]
+        )
+        if generation == self._generation:
+            self._store(user_id, user_limits)
+        return user_limits
+
+    # Пользователь купил премиум
+    def set_premium(self, user_id: int):
+        self._update(user_id, premium=True)
+
+    # У пользователя добавились (delta > 0) или удалились (delta < 0) заметки
+    def change_num_reminders(self, user_id: int, delta: int):
+        entry: Tuple[float, UserLimits] | None = self._entries.get(user_id)
+        if entry is None:
+            self._generation += 1
+            return
+        self._update(user_id, num_reminders=max(entry[1].num_reminders + delta, 0))
+
+    # Удаляем запись пользователя, при следующем обращении она загрузится из бд
+    def invalidate(self, user_id: int):
+        self._generation += 1
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    # Статистика попаданий в кэш
+    def stats(self) -> Dict[str, Any]:
+        requests: int = self._hits + self._misses
+        return {
+            "size": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_ratio": round(self._hits / requests, 3) if requests else None,
+        }
+
+    # Обновляем поля записи, не продлевая время ее жизни
+    def _update(self, user_id: int, **fields):
+        self._generation += 1
+        entry: Tuple[float, UserLimits] | None = self._entries.get(user_id)
+        if entry is not None:
+            self._entries[user_id] = (entry[0], entry[1]._replace(**fields))
+
+    def _store(self, user_id: int, user_limits: UserLimits):
+        self._entries[user_id] = (time.monotonic() + self.ttl, user_limits)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
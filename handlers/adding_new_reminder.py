@@ -12,9 +12,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import default_state
 from aiogram.types import Message, ReplyKeyboardRemove
 from aiogram.types.message import ContentType
-from asyncpg import Record
 
-from database import DataBaseClass, TodayRemindersClass, add_new_user, add_reminder
+from database import DataBaseClass, UserLimitsCacheClass, add_new_user, add_reminder
 from filters import InputIsDate, InputIsTime
 from keyboards import build_kb_with_dates, build_kb_with_one_cancel
 from lexicon import LEXICON_RU
@@ -170,7 +169,7 @@ async def process_input_time(
     valid_time: datetime,
     state: FSMContext,
     database: DataBaseClass,
-    today_reminders: TodayRemindersClass,
+    user_limits: UserLimitsCacheClass,
 ):
     current_date: date = datetime.today().date()
     # Получим ранее введенную дату
@@ -188,8 +187,9 @@ async def process_input_time(
         saved_file_unique_id: str = saved_data["file_unique_id"]
         saved_msg_type: str = saved_data["msg_type"]
 
-        # Добавим новую заметку в базу данных
-        reminder: Record = await add_reminder(
+        # Добавим новую заметку в базу данных. В расписание (свое или другого
+        # процесса бота) она попадет по уведомлению из бд
+        await add_reminder(
             connector=database,
             user_id=message.from_user.id,
             reminder_date=saved_date,
@@ -199,10 +199,8 @@ async def process_input_time(
             file_unique_id=saved_file_unique_id,
             msg_type=saved_msg_type,
         )
-        # Если была выбрана сегодняшняя дата
-        if saved_date == current_date:
-            # Добавим заметку в список сегодняшних заметок
-            today_reminders.push([reminder])
+        # Учтем новую заметку в кэше лимитов пользователя
+        user_limits.change_num_reminders(message.from_user.id, 1)
 
         # Сообщаем пользователю, что заметка успешно сохранена
         await message.answer(
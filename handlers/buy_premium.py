@@ -1,6 +1,7 @@
 from aiogram import Bot
 from aiogram.types import LabeledPrice, Message, PreCheckoutQuery
 
+from database import UserLimitsCacheClass
 from database.connection_pool import DataBaseClass
 from database.methods import set_premium
 from lexicon import LEXICON_RU
@@ -71,7 +72,9 @@ async def send_pre_checkout_query(pre_checkout_query: PreCheckoutQuery, bot: Bot
     await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
 
 
-async def successful_payment(message: Message, database: DataBaseClass):
+async def successful_payment(
+    message: Message, database: DataBaseClass, user_limits: UserLimitsCacheClass
+):
     msg: str = (
         LEXICON_RU["successful_payment_msg"]
         + f"{message.successful_payment.total_amount // 100} "
@@ -79,3 +82,4 @@ async def successful_payment(message: Message, database: DataBaseClass):
     )
     await message.answer(msg)
     await set_premium(connector=database, user_id=message.from_user.id)
+    user_limits.set_premium(message.from_user.id)
@@ -1,5 +1,4 @@
-from datetime import date, timedelta
-from typing import Any, List
+from typing import List
 
 from aiogram import F, Router
 from aiogram.filters import StateFilter
@@ -7,77 +6,73 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
 from asyncpg import Record
 
-from database import (
-    DataBaseClass,
-    TodayRemindersClass,
-    delete_reminder,
-    select_chosen_reminder,
-)
+from database import DataBaseClass, UserLimitsCacheClass, delete_user_reminders
 from filters import ItIsReminderForDeleting
-from keyboards import build_kb_to_edit_list_reminders, build_kb_with_reminders
 from lexicon import LEXICON_RU
+from services import RemindersPaginator
 from states import FSMRemindersEditor
 
 router: Router = Router()
 
 
 # Хэндлер, реагирующий на нажатие на кнопку с заметкой в режиме редактирования
-# списка напоминаний
+# списка напоминаний. Отмечает заметку для удаления (или снимает отметку)
 @router.callback_query(
     StateFilter(FSMRemindersEditor.edit_reminds), ItIsReminderForDeleting()
 )
-async def process_delete_reminder_from_list(
+async def process_select_reminder_to_delete(
     callback: CallbackQuery,
     state: FSMContext,
     database: DataBaseClass,
     reminder_id: int,
-    today_reminders: TodayRemindersClass,
 ):
-    # Если есть, удаляем из списка сегодняшних заметок
-    reminder: Record = await select_chosen_reminder(
-        connector=database, reminder_id=reminder_id
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
     )
-    today_reminders.delete(reminder)
+    await paginator.toggle_selected(reminder_id)
+
+    # Перерисуем клавиатуру с отметками
+    await paginator.edit(callback, editing=True)
+    await callback.answer()
+
 
-    # Удаляем из бд
-    await delete_reminder(connector=database, reminder_id=reminder_id)
+# Хэндлер, реагирующий на кнопку УДАЛИТЬ ВЫБРАННЫЕ в режиме редактирования
+# списка напоминаний. Все отмеченные заметки удаляются одним запросом
+@router.callback_query(
+    StateFilter(FSMRemindersEditor.edit_reminds),
+    F.data == LEXICON_RU["delete_selected_cb"],
+)
+async def process_delete_selected_reminders(
+    callback: CallbackQuery,
+    state: FSMContext,
+    database: DataBaseClass,
+    user_limits: UserLimitsCacheClass,
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
+    )
 
-    # Удаляем из оперативной памяти
-    reminders_info: dict[str, Any] = await state.get_data()
-    reminders: List[Record] = reminders_info["reminders"]
+    # Удаляем из бд все отмеченные заметки пользователя одним запросом
+    deleted: List[Record] = await delete_user_reminders(
+        connector=database,
+        user_id=callback.from_user.id,
+        reminder_ids=await paginator.selected(),
+    )
+    # Из расписаний процессов бота заметки уберутся по уведомлениям из бд
+    # Учтем удаленные заметки в кэше лимитов пользователя
+    user_limits.change_num_reminders(callback.from_user.id, -len(deleted))
 
-    for index in range(len(reminders)):
-        if reminders[index]["reminder_id"] == reminder_id:
-            reminders.pop(index)
-            break
+    # Заново достаем показанную страницу без удаленных заметок
+    await paginator.refresh_after_delete(deleted)
 
-    # Отправляем аллерт о том, что заметка удалена
-    await callback.answer(text=LEXICON_RU["reminder_was_deleted"], show_alert=True)
+    # Отправляем аллерт о том, что заметки удалены
+    await callback.answer(
+        text=LEXICON_RU["reminders_were_deleted"] + str(len(deleted)),
+        show_alert=True,
+    )
 
     # Отправляем сообщение с отредактированным списком заметок пользователю
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    page_size: int = reminders_info["page_size"]
-    view_all_reminders: bool = reminders_info["show_all_reminders"]
-
-    with_date: bool = False
-    with_time: bool = False
-
-    if view_all_reminders:
-        with_date = True
-    else:
-        with_time = True
-
-    await callback.message.edit_text(
-        text=LEXICON_RU["what_reminders_delete"],
-        reply_markup=build_kb_to_edit_list_reminders(
-            user_id=callback.from_user.id,
-            reminders=reminders,
-            pos_first_elem=pos_first_elem,
-            page_size=page_size,
-            with_date=with_date,
-            with_time=with_time,
-        ),
-    )
+    await paginator.edit(callback, editing=True)
 
 
 # Хэндлер, обрабатывающий нажатие на кнопку ОТМЕНА в режиме удаления заметок
@@ -89,152 +84,46 @@ async def process_delete_reminder_from_list(
     StateFilter(FSMRemindersEditor.show_one_reminder),
     F.data == LEXICON_RU["back_to_reminders_menu_cb"],
 )
-async def process_exit_from_deleting_mod(callback: CallbackQuery, state: FSMContext):
-    # Меняем состояние на просмотр списка заметок
+async def process_exit_from_deleting_mod(
+    callback: CallbackQuery, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
+    )
+    # Меняем состояние на просмотр списка заметок и снимаем отметки с заметок
     await state.set_state(FSMRemindersEditor.show_reminds)
+    await paginator.clear_selected()
 
     # Меняем сообщение на просмотр списка заметок с соответствующей клавиатурой
-    reminders_info: dict[str, Any] = await state.get_data()
-    reminders: List[Record] = reminders_info["reminders"]
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    page_size: int = reminders_info["page_size"]
-    view_all_reminders: bool = reminders_info["show_all_reminders"]
-    date_of_showed_reminders: date = reminders_info["date_of_showed_reminders"]
-
-    with_date: bool = False
-    with_time: bool = False
-    text_msg: str
-
-    if view_all_reminders:
-        with_date = True
-        text_msg = LEXICON_RU["view_all_reminders"]
-    else:
-        with_time = True
-        text_msg = LEXICON_RU[
-            "reminders_on_chosen_date_msg"
-        ] + date_of_showed_reminders.strftime("%d.%m.%Y")
-
-    await callback.message.edit_text(
-        text=text_msg,
-        reply_markup=build_kb_with_reminders(
-            user_id=callback.from_user.id,
-            reminders=reminders,
-            pos_first_elem=pos_first_elem,
-            page_size=page_size,
-            with_data=with_date,
-            with_time=with_time,
-        ),
-    )
+    await paginator.edit(callback)
+    await callback.answer()
 
 
 # Хэндлер, отвечающий за пагинацию в режиме редактирования списка заметок
 @router.callback_query(
     StateFilter(FSMRemindersEditor.edit_reminds),
-    F.data == LEXICON_RU["previous_page_cb" or F.data == LEXICON_RU["next_page_cb"]],
+    F.data.in_({LEXICON_RU["previous_page_cb"], LEXICON_RU["next_page_cb"]}),
 )
-async def process_pagination_in_del_list(callback: CallbackQuery, state: FSMContext):
-    # Достанем необходимую информацию из оперативной памяти
-    reminders_info = await state.get_data()
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    page_size: int = reminders_info["page_size"]
-    reminders: List[Record] = reminders_info["reminders"]
-
-    need_to_change_msg: bool
-    # Если пользователь находится не в самом начале, и он нажал на кнопку <<
-    if (callback.data == LEXICON_RU["previous_page_cb"]) and (pos_first_elem > 0):
-        # Уменьшим позицию первой отображаемой заметки на длину отображаемого списка
-        pos_first_elem -= page_size
-        need_to_change_msg = True
-    # Если пользователь находится не в самом конце, и он нажал на кнопку >>
-    elif (callback.data == LEXICON_RU["next_page_cb"]) and (
-        pos_first_elem + page_size < len(reminders)
-    ):
-        # Увеличим позицию первой отображаемой заметки на длину отображаемого списка
-        pos_first_elem += page_size
-        need_to_change_msg = True
-    # Если пользователь нажимает << в самом начале или >> в самом конце
-    else:
-        # Нам не нужно ничего менять
-        need_to_change_msg = False
-        await callback.answer()
-
-    # Если мы меняли отображаемый список (листали его)
-    if need_to_change_msg:
-        all_reminders: bool = reminders_info["show_all_reminders"]
-        date_of_showed_reminders: date = reminders_info["date_of_showed_reminders"]
-
-        msg_text: str
-        with_data: bool = False
-        with_time: bool = False
-
-        # В зависимости от того, что мы выводили ранее (все заметки,
-        # заметки на сегодня и пр.) будут разниться текст сообщения и формат
-        # выводимых заметок (с датой или временем)
-        # Если до этого выводили все заметки
-        if all_reminders:
-            msg_text = LEXICON_RU["view_all_reminders"]
-            with_data = True
-        # Если до этого выводили заметки на сегодня
-        elif date_of_showed_reminders == date.today():
-            msg_text = LEXICON_RU["today_msg"]
-            with_time = True
-        # Если до этого выводили заметки на сегодня
-        elif date_of_showed_reminders == date.today() + timedelta(days=1):
-            msg_text = LEXICON_RU["tomorrow_msg"]
-            with_time = True
-        # Если до этого выводили заметки на определенную дату
-        else:
-            msg_text = LEXICON_RU[
-                "reminders_on_chosen_date_msg"
-            ] + date_of_showed_reminders.strftime("%d.%m.%Y")
-            with_time = True
-
-        # Отправим пользователю список заметок
-        await callback.message.edit_text(
-            text=msg_text,
-            reply_markup=build_kb_to_edit_list_reminders(
-                user_id=callback.from_user.id,
-                reminders=reminders,
-                pos_first_elem=pos_first_elem,
-                page_size=page_size,
-                with_date=with_data,
-                with_time=with_time,
-            ),
-        )
-        await callback.answer()
-
-        # Обновим информацию в оперативной памяти
-        await state.update_data(pos_first_elem=pos_first_elem)
+async def process_pagination_in_del_list(
+    callback: CallbackQuery, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
+    )
+    # Отметки заметок сохраняются при листании
+    if await paginator.flip(forward=callback.data == LEXICON_RU["next_page_cb"]):
+        await paginator.edit(callback, editing=True)
+    await callback.answer()
 
 
 # Хэндлер, реагирующий на все остальные сообщение в режиме редактирования
 # списка заметок
 @router.message(StateFilter(FSMRemindersEditor.edit_reminds))
-async def other_message_in_editing_list_mod(message: Message, state: FSMContext):
-    # Получим все необходимые данные из оперативной памяти
-    reminders_info: dict[str, Any] = await state.get_data()
-    reminders: List[Record] = reminders_info["reminders"]
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    page_size: int = reminders_info["page_size"]
-    view_all_reminders: bool = reminders_info["show_all_reminders"]
-
-    with_date: bool = False
-    with_time: bool = False
-
-    if view_all_reminders:
-        with_date = True
-    else:
-        with_time = True
-
-    # Изменим текст сообщения и скажем, что не понимаем пользователя
-    await message.answer(
-        text=LEXICON_RU["not_understand"],
-        reply_markup=build_kb_to_edit_list_reminders(
-            user_id=message.from_user.id,
-            reminders=reminders,
-            pos_first_elem=pos_first_elem,
-            page_size=page_size,
-            with_date=with_date,
-            with_time=with_time,
-        ),
+async def other_message_in_editing_list_mod(
+    message: Message, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, message.from_user.id
     )
+    # Скажем, что не понимаем пользователя, и снова пришлем список
+    await paginator.send(message, editing=True, text=LEXICON_RU["not_understand"])
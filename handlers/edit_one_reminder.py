@@ -14,9 +14,7 @@ from asyncpg import Record
 
 from database import (
     DataBaseClass,
-    TodayRemindersClass,
-    select_chosen_reminder,
-    update_reminder_date,
+    update_reminder_datetime,
     update_reminder_text,
     update_reminder_time,
 )
@@ -30,12 +28,13 @@ from utils.utils import send_not_text
 router: Router = Router()
 
 
-async def _send_modified_reminder(message: Message, state: FSMContext):
-    reminder_info: dict[str, Any] = await state.get_data()
-    msg_type: str = reminder_info["msg_type"]
-    reminder_text: str = reminder_info["reminder_text"]
-    reminder_date: date = reminder_info["reminder_date"]
-    reminder_time: time = reminder_info["reminder_time"]
+# Показываем измененную заметку (строку, которую вернул UPDATE ... RETURNING)
+# и спрашиваем, что еще нужно изменить
+async def _send_modified_reminder(message: Message, reminder: Record):
+    msg_type: str = reminder["msg_type"]
+    reminder_text: str = reminder["reminder_text"]
+    reminder_date: date = reminder["reminder_date"]
+    reminder_time: time = reminder["reminder_time"]
 
     if msg_type == "text":
         await message.answer(
@@ -47,13 +46,10 @@ async def _send_modified_reminder(message: Message, state: FSMContext):
             reply_markup=build_kb_to_edit_one_reminder(),
         )
     else:
-        user_id: int = reminder_info["user_id"]
-        file_id: str = reminder_info["file_id"]
-
         caption: str | None = await send_not_text(
             msg_type=msg_type,
-            user_id=user_id,
-            file_id=file_id,
+            user_id=reminder["user_id"],
+            file_id=reminder["file_id"],
             reminder_text=reminder_text,
         )
         await message.answer(
@@ -64,6 +60,13 @@ async def _send_modified_reminder(message: Message, state: FSMContext):
         )
 
 
+# Заметки уже нет в бд (ее отправили или удалили, пока пользователь
+# редактировал): редактировать нечего
+async def _reminder_is_gone(message: Message, state: FSMContext):
+    await message.answer(text=LEXICON_RU["reminder_was_deleted"])
+    await state.clear()
+
+
 # Хэндлер, реагирующий на нажатие кнопки Текст в режиме редактирования
 @router.callback_query(
     StateFilter(FSMRemindersEditor.edit_one_reminder),
@@ -92,27 +95,21 @@ async def process_enter_new_text(
     message: Message,
     state: FSMContext,
     database: DataBaseClass,
-    today_reminders: TodayRemindersClass,
 ):
-    # Обновим базу данных
+    # Обновим базу данных и сразу получим измененную заметку
     reminder_info = await state.get_data()
-
-    await update_reminder_text(database, reminder_info["reminder_id"], message.text)
+    reminder: Record | None = await update_reminder_text(
+        database, reminder_info["reminder_id"], message.text
+    )
+    if reminder is None:
+        await _reminder_is_gone(message, state)
+        return
 
     # Обновим информацию в оперативной памяти
-    await state.update_data(reminder_text=message.text)
-
-    # Если дата заметки - сегодня
-    if reminder_info["reminder_date"] == date.today():
-        # Изменим соответствующую заметку в списке сегодняшних заметок
-        new_reminder: Record = await select_chosen_reminder(
-            connector=database, reminder_id=reminder_info["reminder_id"]
-        )
-        today_reminders.delete(new_reminder)
-        today_reminders.push([new_reminder])
+    await state.update_data(reminder_text=reminder["reminder_text"])
 
     # Покажем обновленную заметку и спросим что еще нужно изменить
-    await _send_modified_reminder(message, state)
+    await _send_modified_reminder(message, reminder)
 
     # Перейдем обратно в режим редактирования одной заметки
     await state.set_state(FSMRemindersEditor.edit_one_reminder)
@@ -141,34 +138,31 @@ async def process_enter_new_date(
     database: DataBaseClass,
     state: FSMContext,
     valid_date: bool | datetime,
-    today_reminders: TodayRemindersClass,
 ):
     # Если пользователь прислал валидную дату, которая ЕЩЕ НЕ прошла
     if valid_date:
-        # Обновим информацию в базе данных
+        # Фильтр проверил, что не прошли новая дата вместе со временем заметки
+        # из оперативной памяти, поэтому запишем в бд именно их (одним
+        # запросом) и сразу получим измененную заметку
         reminder_info = await state.get_data()
-        await update_reminder_date(
-            database, reminder_info["reminder_id"], valid_date.date()
+        reminder: Record | None = await update_reminder_datetime(
+            database,
+            reminder_info["reminder_id"],
+            valid_date.date(),
+            reminder_info["reminder_time"],
         )
+        if reminder is None:
+            await _reminder_is_gone(message, state)
+            return
 
         # Обновим информацию в оперативной памяти
-        await state.update_data(reminder_date=valid_date.date())
-
-        # Получим измененную заметку
-        new_reminder = await select_chosen_reminder(
-            connector=database, reminder_id=reminder_info["reminder_id"]
+        await state.update_data(
+            reminder_date=reminder["reminder_date"],
+            reminder_time=reminder["reminder_time"],
         )
-        # Если выбранная дата - сегодня
-        if valid_date == date.today():
-            # Добавим ее в список сегодняшних заметок
-            today_reminders.push([new_reminder])
-        # Если выбранная дата - НЕ сегодня
-        else:
-            # Удалим ее из списка сегодняшних заметок (если она там есть)
-            today_reminders.delete(reminder=new_reminder)
 
         # Отправим пользователю обновленную заметку и спросим, что еще нужно изменить
-        await _send_modified_reminder(message, state)
+        await _send_modified_reminder(message, reminder)
 
         # Изменим состояние на редактирование одной заметки
         await state.set_state(FSMRemindersEditor.edit_one_reminder)
@@ -204,7 +198,6 @@ async def process_enter_correct_date(
     state: FSMContext,
     selected_more_current: bool,
     valid_time: datetime,
-    today_reminders: TodayRemindersClass,
 ):
     # Получим информацию о заметке из оперативной памяти
     reminder_info = await state.get_data()
@@ -215,26 +208,19 @@ async def process_enter_correct_date(
     if ((reminder_date == date.today()) and selected_more_current) or (
         reminder_date > date.today()
     ):
-        # Обновим информацию в базе данных
-        await update_reminder_time(
+        # Обновим информацию в базе данных и сразу получим измененную заметку
+        reminder: Record | None = await update_reminder_time(
             database, reminder_info["reminder_id"], valid_time.time()
         )
+        if reminder is None:
+            await _reminder_is_gone(message, state)
+            return
 
         # Обновим информацию в оперативной памяти
-        await state.update_data(reminder_time=valid_time.time())
-
-        # Если дата заметки - сегодня
-        if reminder_info["reminder_date"] == date.today():
-            # Изменим соответствующую заметку в списке сегодняшних заметок
-            new_reminder: Record = await select_chosen_reminder(
-                connector=database, reminder_id=reminder_info["reminder_id"]
-            )
-            print(new_reminder["reminder_id"])
-            today_reminders.delete(new_reminder)
-            today_reminders.push([new_reminder])
+        await state.update_data(reminder_time=reminder["reminder_time"])
 
         # Покажем пользователю обновленную заметку и спросим, что еще нужно изменить
-        await _send_modified_reminder(message, state)
+        await _send_modified_reminder(message, reminder)
 
         # Изменим состояние на редактирование одной заметки
         await state.set_state(FSMRemindersEditor.edit_one_reminder)
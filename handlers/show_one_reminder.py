@@ -6,7 +6,7 @@ from aiogram.filters import StateFilter, or_f
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
 
-from database import DataBaseClass, TodayRemindersClass, delete_reminder
+from database import DataBaseClass, UserLimitsCacheClass, delete_reminder
 from keyboards import build_kb_to_edit_one_reminder, build_kb_with_reminder
 from lexicon import LEXICON_RU
 from states import FSMRemindersEditor
@@ -25,16 +25,14 @@ async def process_delete_one_reminder(
     callback: CallbackQuery,
     database: DataBaseClass,
     state: FSMContext,
-    today_reminders: TodayRemindersClass,
+    user_limits: UserLimitsCacheClass,
 ):
     # Удаляем напоминание из базы данных
     saved_info: dict[str, Any] = await state.get_data()
-    await delete_reminder(database, int(saved_info["reminder_id"]))
-
-    # Если дата заметки - сегодня:
-    if saved_info["reminder_date"] == date.today():
-        # Удаляем заметку из списка сегодняшних дел
-        today_reminders.delete(saved_info["reminder_id"])
+    # Учтем удаленную заметку в кэше лимитов пользователя (если ее еще
+    # не удалили, например, после отправки)
+    if await delete_reminder(database, int(saved_info["reminder_id"])):
+        user_limits.change_num_reminders(callback.from_user.id, -1)
 
     # Удаляем сообщение с заметкой
     await callback.message.delete()
@@ -3,7 +3,6 @@
 """
 
 from datetime import date, datetime, time, timedelta
-from typing import Any, List
 
 from aiogram import F, Router
 from aiogram.filters import Command, StateFilter, or_f
@@ -12,20 +11,11 @@ from aiogram.fsm.state import default_state
 from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
 from asyncpg import Record
 
-from database import (
-    DataBaseClass,
-    select_chosen_reminder,
-    select_reminders,
-    show_all_reminders,
-)
+from database import DataBaseClass, select_chosen_reminder
 from filters import InputIsDate, ItIsInlineButtonWithReminder, ItIsPageNumber
-from keyboards import (
-    build_kb_to_choose_date_to_show,
-    build_kb_to_edit_list_reminders,
-    build_kb_with_reminder,
-    build_kb_with_reminders,
-)
+from keyboards import build_kb_to_choose_date_to_show, build_kb_with_reminder
 from lexicon import LEXICON_RU
+from services import RemindersPaginator
 from states import FSMRemindersEditor
 from utils import assemble_full_reminder_text
 from utils.utils import send_not_text
@@ -33,9 +23,6 @@ from utils.utils import send_not_text
 router: Router = Router()
 
 
-PAGE_SIZE: int = 10
-
-
 # Обработка команды /reminders
 @router.message(Command(commands=["reminders"]), StateFilter(default_state))
 async def process_reminders_command(message: Message, state: FSMContext):
@@ -85,7 +72,7 @@ async def process_cancel_view_reminders(callback: CallbackQuery, state: FSMConte
 # просмотра напоминаний, или команды /today и /tomorrow в дефолтном состоянии
 @router.message(
     StateFilter(FSMRemindersEditor.fill_date_to_show_reminders),
-    F.text == LEXICON_RU["today_bt_text"] or F.text == LEXICON_RU["tomorrow_bt_text"],
+    F.text.in_({LEXICON_RU["today_bt_text"], LEXICON_RU["tomorrow_bt_text"]}),
 )
 @router.message(StateFilter(default_state), Command(commands=["today", "tomorrow"]))
 async def show_today_or_tomorrow_reminders(
@@ -96,50 +83,25 @@ async def show_today_or_tomorrow_reminders(
         text=LEXICON_RU["sec_please"], reply_markup=ReplyKeyboardRemove()
     )
 
-    # В зависимости от выбранного дня будут разные даты и тексты сообщений
-    reminders: List[Record]
-    msg_text: str
     selected_date: date
-
     # Если выбран сегодняшний день
     if (message.text == LEXICON_RU["today_bt_text"]) or (message.text == "/today"):
-        # Укажем сегодняшний день и соответсвующее сообщение пользователю
         selected_date = date.today()
-        msg_text = LEXICON_RU["today_msg"]
     # Если выбран завтрашний день
     else:
-        # Укажем завтрашний день и соответсвующее сообщение пользователю
         selected_date = date.today() + timedelta(days=1)
-        msg_text = LEXICON_RU["tomorrow_msg"]
 
-    # Достанем необходимую информацию из базы данных
-    reminders = await select_reminders(
-        connector=database, user_id=message.from_user.id, reminder_date=selected_date
-    )
-
-    # Сохраним данные в оперативной памяти
-    await state.update_data(
-        date_of_showed_reminders=selected_date,
-        show_all_reminders=False,
-        reminders=reminders,
-        pos_first_elem=0,
-        page_size=PAGE_SIZE,
+    # Откроем первую страницу заметок на выбранный день
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, message.from_user.id
     )
+    await paginator.open(reminder_date=selected_date)
 
     # Изменим состояние на просмотр списка заметок
     await state.set_state(FSMRemindersEditor.show_reminds)
 
     # Отправим пользователю клавиатуру с заметками
-    await message.answer(
-        text=msg_text,
-        reply_markup=build_kb_with_reminders(
-            user_id=message.from_user.id,
-            reminders=reminders,
-            pos_first_elem=0,
-            with_time=True,
-            page_size=PAGE_SIZE,
-        ),
-    )
+    await paginator.send(message)
 
 
 # Хэндлер для обработки правильно введенной (по формату) даты
@@ -160,39 +122,17 @@ async def show_reminders_on_chosen_date(
             text=LEXICON_RU["sec_please"], reply_markup=ReplyKeyboardRemove()
         )
 
-        # Достанем необходимую информацию из базы данных
-        reminders: List[Record] = await select_reminders(
-            connector=database,
-            user_id=message.from_user.id,
-            reminder_date=valid_date.date(),
-        )
-
-        # Сохраним данные в оперативной памяти
-        await state.update_data(
-            date_of_showed_reminders=valid_date,
-            show_all_reminders=False,
-            reminders=reminders,
-            pos_first_elem=0,
-            page_size=PAGE_SIZE,
+        # Откроем первую страницу заметок на выбранную дату
+        paginator: RemindersPaginator = RemindersPaginator(
+            state, database, message.from_user.id
         )
+        await paginator.open(reminder_date=valid_date.date())
 
         # Изменим состояние на просмотр списка заметок
         await state.set_state(FSMRemindersEditor.show_reminds)
 
         # Пришлем пользователю клавиатуру с заметками на выбранную дату
-        await message.answer(
-            text=(
-                LEXICON_RU["reminders_on_chosen_date_msg"]
-                + valid_date.strftime("%d.%m.%Y")
-            ),
-            reply_markup=build_kb_with_reminders(
-                user_id=message.from_user.id,
-                reminders=reminders,
-                pos_first_elem=0,
-                with_time=True,
-                page_size=PAGE_SIZE,
-            ),
-        )
+        await paginator.send(message)
     # Если пришла корректная дата, которая УЖЕ прошла
     else:
         await message.answer(text=LEXICON_RU["past_date"])
@@ -211,34 +151,17 @@ async def process_show_all_reminders(
         text=LEXICON_RU["sec_please"], reply_markup=ReplyKeyboardRemove()
     )
 
-    # Достанем все напоминания из базы данных
-    reminders: List[Record] = await show_all_reminders(
-        connector=database, user_id=message.from_user.id
-    )
-
-    # Сохраним данные в оперативной памяти
-    await state.update_data(
-        date_of_showed_reminders=date.today(),
-        show_all_reminders=True,
-        reminders=reminders,
-        pos_first_elem=0,
-        page_size=PAGE_SIZE,
+    # Откроем первую страницу всех заметок
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, message.from_user.id
     )
+    await paginator.open(reminder_date=None)
 
     # Изменим состояние на просмотр списка заметок
     await state.set_state(FSMRemindersEditor.show_reminds)
 
     # Отправим пользователю клавиатуру со всеми заметками
-    await message.answer(
-        text=LEXICON_RU["view_all_reminders"],
-        reply_markup=build_kb_with_reminders(
-            user_id=message.from_user.id,
-            reminders=reminders,
-            pos_first_elem=0,
-            page_size=PAGE_SIZE,
-            with_data=True,
-        ),
-    )
+    await paginator.send(message)
 
 
 # Хэндлер, реагирующий на все остальные сообщения в состоянии ввода даты для
@@ -255,85 +178,24 @@ async def process_enter_not_date(message: Message):
 # Хэндлер для пагинации страниц в просматриваемом списке
 @router.callback_query(
     StateFilter(FSMRemindersEditor.show_reminds),
-    F.data == LEXICON_RU["previous_page_cb"] or F.data == LEXICON_RU["next_page_cb"],
+    F.data.in_({LEXICON_RU["previous_page_cb"], LEXICON_RU["next_page_cb"]}),
 )
-async def process_pagination(callback: CallbackQuery, state: FSMContext):
-    # Достанем необходимую информацию из оперативной памяти
-    reminders_info = await state.get_data()
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    page_size: int = reminders_info["page_size"]
-    reminders: List[Record] = reminders_info["reminders"]
-
-    need_to_change_msg: bool
-    # Если пользователь находится не в самом начале, и он нажал на кнопку <<
-    if (callback.data == LEXICON_RU["previous_page_cb"]) and (pos_first_elem > 0):
-        # Уменьшим позицию первой отображаемой заметки на длину отображаемого списка
-        pos_first_elem -= page_size
-        need_to_change_msg = True
-    # Если пользователь находится не в самом конце, и он нажал на кнопку >>
-    elif (callback.data == LEXICON_RU["next_page_cb"]) and (
-        pos_first_elem + page_size < len(reminders)
-    ):
-        # Увеличим позицию первой отображаемой заметки на длину отображаемого списка
-        pos_first_elem += page_size
-        need_to_change_msg = True
-    # Если пользователь нажимает << в самом начале или >> в самом конце
-    else:
-        # Нам не нужно ничего менять
-        need_to_change_msg = False
-        await callback.answer()
-
-    # Если мы меняли отображаемый список (листали его)
-    if need_to_change_msg:
-        all_reminders: bool = reminders_info["show_all_reminders"]
-        date_of_showed_reminders: date = reminders_info["date_of_showed_reminders"]
-
-        msg_text: str
-        with_data: bool = False
-        with_time: bool = False
-
-        # В зависимости от того, что мы выводили ранее (все заметки,
-        # заметки на сегодня и пр.) будут разниться текст сообщения и формат
-        # выводимых заметок (с датой или временем)
-        # Если до этого выводили все заметки
-        if all_reminders:
-            msg_text = LEXICON_RU["view_all_reminders"]
-            with_data = True
-        # Если до этого выводили заметки на сегодня
-        elif date_of_showed_reminders == date.today():
-            msg_text = LEXICON_RU["today_msg"]
-            with_time = True
-        # Если до этого выводили заметки на сегодня
-        elif date_of_showed_reminders == date.today() + timedelta(days=1):
-            msg_text = LEXICON_RU["tomorrow_msg"]
-            with_time = True
-        # Если до этого выводили заметки на определенную дату
-        else:
-            msg_text = LEXICON_RU[
-                "reminders_on_chosen_date_msg"
-            ] + date_of_showed_reminders.strftime("%d.%m.%Y")
-            with_time = True
-
-        # Отправим пользователю список заметок
-        await callback.message.edit_text(
-            text=msg_text,
-            reply_markup=build_kb_with_reminders(
-                user_id=callback.from_user.id,
-                reminders=reminders,
-                pos_first_elem=pos_first_elem,
-                page_size=page_size,
-                with_data=with_data,
-                with_time=with_time,
-            ),
-        )
-        await callback.answer()
-
-        # Обновим информацию в оперативной памяти
-        await state.update_data(pos_first_elem=pos_first_elem)
+async def process_pagination(
+    callback: CallbackQuery, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
+    )
+    # Если пользователь нажимает << в самом начале или >> в самом конце,
+    # сообщение не меняется
+    if await paginator.flip(forward=callback.data == LEXICON_RU["next_page_cb"]):
+        await paginator.edit(callback)
+    await callback.answer()
 
 
 # Хэндлер, который реагирует на нажатие кнопки с количеством напоминаний
-# в состояниях просмотра и редактирования списка заметок
+# (или кнопки страницы под ней) в состояниях просмотра и редактирования
+# списка заметок
 @router.callback_query(
     or_f(
         StateFilter(FSMRemindersEditor.show_reminds),
@@ -341,16 +203,28 @@ async def process_pagination(callback: CallbackQuery, state: FSMContext):
     ),
     ItIsPageNumber(),
 )
-async def process_view_number_reminders(callback: CallbackQuery, state: FSMContext):
-    # Получим список всех запрошенных заметок и узнаем его длину
-    reminder_info = await state.get_data()
-    reminders: List[Record] = reminder_info["reminders"]
-    number_reminders: int = len(reminders)
-
-    # Отправим пользователю нотификацию с указанием общего количества
-    # запрошенных заметок
+async def process_page_number(
+    callback: CallbackQuery, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
+    )
+    editing: bool = await state.get_state() == FSMRemindersEditor.edit_reminds.state
+    # callback кнопки - позиция первой заметки страницы и следующей за последней
+    pos_first_elem: int = int(callback.data.split("-")[0])
+
+    # Нажата кнопка другой страницы - переходим на нее
+    if await paginator.jump(pos_first_elem):
+        await paginator.edit(callback, editing=editing)
+        await callback.answer()
+        return
+
+    # Нажата кнопка текущей страницы - показываем (или прячем) выбор страницы
+    # и общее количество запрошенных заметок
+    await paginator.toggle_page_picker()
+    await paginator.edit(callback, editing=editing)
     await callback.answer(
-        text=LEXICON_RU["number_showed_reminders"] + str(number_reminders)
+        text=LEXICON_RU["number_showed_reminders"] + str(await paginator.total())
     )
 
 
@@ -421,32 +295,15 @@ async def show_chosen_reminder(
 @router.callback_query(
     StateFilter(FSMRemindersEditor.show_reminds), F.data == LEXICON_RU["edit_cb"]
 )
-async def process_edit_list_reminders(callback: CallbackQuery, state: FSMContext):
-    reminders_info = await state.get_data()
-    reminders: List[Record] = reminders_info["reminders"]
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    view_all_reminders: bool = reminders_info["show_all_reminders"]
-    page_size: int = reminders_info["page_size"]
-
-    with_date: bool = False
-    with_time: bool = False
-
-    if view_all_reminders:
-        with_date = True
-    else:
-        with_time = True
-
-    await callback.message.edit_text(
-        text=LEXICON_RU["what_reminders_delete"],
-        reply_markup=build_kb_to_edit_list_reminders(
-            user_id=callback.from_user.id,
-            reminders=reminders,
-            pos_first_elem=pos_first_elem,
-            page_size=page_size,
-            with_date=with_date,
-            with_time=with_time,
-        ),
+async def process_edit_list_reminders(
+    callback: CallbackQuery, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, callback.from_user.id
     )
+    # В режиме удаления пока ни одна заметка не отмечена
+    await paginator.clear_selected()
+    await paginator.edit(callback, editing=True)
 
     await state.set_state(FSMRemindersEditor.edit_reminds)
     await callback.answer()
@@ -455,31 +312,11 @@ async def process_edit_list_reminders(callback: CallbackQuery, state: FSMContext
 # Хэндлер, который реагирует на обычное сообщение в состоянии просмотра
 # списка заметок
 @router.message(StateFilter(FSMRemindersEditor.show_reminds))
-async def process_other_message_in_reminders(message: Message, state: FSMContext):
-    # Получим все необходимые данные из оперативной памяти
-    reminders_info: dict[str, Any] = await state.get_data()
-    reminders: List[Record] = reminders_info["reminders"]
-    pos_first_elem: int = reminders_info["pos_first_elem"]
-    page_size: int = reminders_info["page_size"]
-    view_all_reminders: bool = reminders_info["show_all_reminders"]
-
-    with_date: bool = False
-    with_time: bool = False
-
-    if view_all_reminders:
-        with_date = True
-    else:
-        with_time = True
-
-    # Изменим текст сообщения и скажем, что не понимаем пользователя
-    await message.answer(
-        text=LEXICON_RU["not_understand"],
-        reply_markup=build_kb_with_reminders(
-            user_id=message.from_user.id,
-            reminders=reminders,
-            pos_first_elem=pos_first_elem,
-            page_size=page_size,
-            with_data=with_date,
-            with_time=with_time,
-        ),
+async def process_other_message_in_reminders(
+    message: Message, state: FSMContext, database: DataBaseClass
+):
+    paginator: RemindersPaginator = RemindersPaginator(
+        state, database, message.from_user.id
     )
+    # Скажем, что не понимаем пользователя, и снова пришлем список
+    await paginator.send(message, text=LEXICON_RU["not_understand"])
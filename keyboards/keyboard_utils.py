@@ -1,9 +1,16 @@
 """
 Вспомогательные функции / методы, помогающие формировать клавиатуры.
+
+Клавиатуры, которые не зависят от аргументов, собираются один раз и затем
+отдаются готовыми (объекты клавиатур aiogram неизменяемые, поэтому их можно
+отправлять многим пользователям). Подписи кнопок с заметками кэшируются
+по полям заметки, поэтому при листании списка они не форматируются заново.
 """
 
+import math
 from datetime import date, time
-from typing import List
+from functools import lru_cache
+from typing import Collection, List, Set
 
 from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
@@ -17,7 +24,97 @@ from asyncpg import Record
 
 from lexicon import LEXICON_RU
 
+# Сколько подписей кнопок с заметками хранится в кэше
+LABELS_CACHE_SIZE: int = 10000
+# Сколько страниц показывается в выборе страницы списка
+PAGE_PICKER_SIZE: int = 8
+
+
+# Подпись кнопки с заметкой в списке: дата или время (в зависимости от того,
+# какой список показывается), тип сообщения и начало текста
+@lru_cache(maxsize=LABELS_CACHE_SIZE)
+def _build_reminder_label(
+    reminder_date: date,
+    reminder_time: time,
+    msg_type: str,
+    reminder_text: str | None,
+    with_date: bool,
+    with_time: bool,
+) -> str:
+    button_text: str = ""
+    if with_date:
+        button_text += reminder_date.strftime("%d.%m.%Y") + " "
+    if with_time:
+        button_text += reminder_time.strftime("%H:%M") + " "
+
+    if msg_type != "text":
+        button_text += msg_type + " "
+    if (msg_type not in {"voice", "video_note"}) and (reminder_text is not None):
+        button_text += reminder_text
+    return button_text
+
+
+# Подпись кнопки с заметкой. В ключ кэша попадают только первые 100 символов
+# текста - больше на кнопке не показывается
+def _reminder_label(reminder: Record, with_date: bool, with_time: bool) -> str:
+    reminder_text: str | None = reminder["reminder_text"]
+    return _build_reminder_label(
+        reminder["reminder_date"],
+        reminder["reminder_time"],
+        reminder["msg_type"],
+        reminder_text[:100] if reminder_text is not None else None,
+        with_date,
+        with_time,
+    )
+
+
+# Добавляем кнопки навигации по списку: <<, кнопку с номерами показанных
+# заметок и >>. Если page_picker, под ними - кнопки страниц рядом с текущей.
+# callback кнопок страниц такой же, как у кнопки с номерами заметок
+# (позиция первой заметки страницы и следующей за последней)
+def _add_navigation(
+    kb_builder: InlineKeyboardBuilder,
+    pos_first_elem: int,
+    limit: int,
+    page_size: int,
+    total_reminders: int,
+    page_picker: bool,
+):
+    bt_previous_page: InlineKeyboardButton = InlineKeyboardButton(
+        text=LEXICON_RU["previous_page"], callback_data=LEXICON_RU["previous_page_cb"]
+    )
+    bt_next_page: InlineKeyboardButton = InlineKeyboardButton(
+        text=LEXICON_RU["next_page"], callback_data=LEXICON_RU["next_page_cb"]
+    )
+    bt_number_showed_reminders: InlineKeyboardButton = InlineKeyboardButton(
+        text=str(pos_first_elem) + " - " + str(limit),
+        callback_data=str(pos_first_elem) + "-" + str(limit),
+    )
+    kb_builder.row(
+        *[bt_previous_page, bt_number_showed_reminders, bt_next_page], width=3
+    )
+
+    pages: int = math.ceil(total_reminders / page_size)
+    if not page_picker or pages < 2:
+        return
 
+    current_page: int = pos_first_elem // page_size
+    first_page: int = max(
+        min(current_page - PAGE_PICKER_SIZE // 2, pages - PAGE_PICKER_SIZE), 0
+    )
+    buttons_with_pages: List[InlineKeyboardButton] = []
+    for page in range(first_page, min(first_page + PAGE_PICKER_SIZE, pages)):
+        start: int = page * page_size
+        buttons_with_pages.append(
+            InlineKeyboardButton(
+                text=f"· {page + 1} ·" if page == current_page else str(page + 1),
+                callback_data=f"{start}-{min(start + page_size, total_reminders)}",
+            )
+        )
+    kb_builder.row(*buttons_with_pages, width=PAGE_PICKER_SIZE)
+
+
+@lru_cache(maxsize=None)
 def build_kb_with_dates() -> ReplyKeyboardMarkup:
     kb_builder: ReplyKeyboardBuilder = ReplyKeyboardBuilder()
 
@@ -29,6 +126,7 @@ def build_kb_with_dates() -> ReplyKeyboardMarkup:
     return kb_builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def build_kb_with_one_cancel() -> ReplyKeyboardMarkup:
     kb_builder: ReplyKeyboardBuilder = ReplyKeyboardBuilder()
 
@@ -38,6 +136,7 @@ def build_kb_with_one_cancel() -> ReplyKeyboardMarkup:
     return kb_builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def build_kb_to_choose_date_to_show() -> ReplyKeyboardMarkup:
     kb_builder: ReplyKeyboardBuilder = ReplyKeyboardBuilder()
 
@@ -56,7 +155,9 @@ class RemindersCallbackFactory(CallbackData, prefix="view"):
 
 
 # Билдер клавиатуры для просмотра списка заметок на выбранную дату
-# (или для просмотра всех заметок)
+# (или для просмотра всех заметок). reminders - только заметки показываемой
+# страницы, pos_first_elem - позиция первой из них во всем списке,
+# page_picker - показать выбор страницы
 def build_kb_with_reminders(
     user_id: int,
     reminders: List[Record],
@@ -64,6 +165,8 @@ def build_kb_with_reminders(
     page_size: int = 10,
     with_data: bool = False,
     with_time: bool = False,
+    total_reminders: int = 0,
+    page_picker: bool = False,
 ) -> InlineKeyboardMarkup:
     kb_builder: InlineKeyboardBuilder = InlineKeyboardBuilder()
 
@@ -71,49 +174,18 @@ def build_kb_with_reminders(
     # то на кнопках будут указаны их время. Если нужно вывести все заметки,
     # то будут указаны даты
     buttons_with_reminders: List[InlineKeyboardButton] = []
-    limit = pos_first_elem + page_size
-    if len(reminders) < limit:
-        limit = len(reminders)
-
-    for num in range(pos_first_elem, limit):
-        button_text: str = ""
-        if with_data:
-            reminder_date: date = reminders[num]["reminder_date"]
-            button_text += reminder_date.strftime("%d.%m.%Y") + " "
-        if with_time:
-            reminder_time: time = reminders[num]["reminder_time"]
-            button_text += reminder_time.strftime("%H:%M") + " "
-
-        msg_type: str = reminders[num]["msg_type"]
-
-        if msg_type != "text":
-            button_text += msg_type + " "
-        if (msg_type not in {"voice", "video_note"}) and (
-            reminders[num]["reminder_text"] is not None
-        ):
-            button_text += reminders[num]["reminder_text"][:100]
+    limit: int = pos_first_elem + len(reminders)
 
+    for reminder in reminders:
         button: InlineKeyboardButton = InlineKeyboardButton(
-            text=button_text,
+            text=_reminder_label(reminder, with_data, with_time),
             callback_data=RemindersCallbackFactory(
-                user_id=user_id, reminder_id=reminders[num]["reminder_id"]
+                user_id=user_id, reminder_id=reminder["reminder_id"]
             ).pack(),
         )
 
         buttons_with_reminders.append(button)
 
-    # Теперь создадим кнопки для навигации по списку
-    bt_previous_page: InlineKeyboardButton = InlineKeyboardButton(
-        text=LEXICON_RU["previous_page"], callback_data=LEXICON_RU["previous_page_cb"]
-    )
-    bt_next_page: InlineKeyboardButton = InlineKeyboardButton(
-        text=LEXICON_RU["next_page"], callback_data=LEXICON_RU["next_page_cb"]
-    )
-    bt_number_showed_reminders: InlineKeyboardButton = InlineKeyboardButton(
-        text=str(pos_first_elem) + " - " + str(limit),
-        callback_data=str(pos_first_elem) + "-" + str(limit),
-    )
-
     # Последние кнопки - кнопки РЕДАКТИРОВАТЬ и НАЗАД
     bt_edit: InlineKeyboardButton = InlineKeyboardButton(
         text=LEXICON_RU["edit"], callback_data=LEXICON_RU["edit_cb"]
@@ -123,8 +195,9 @@ def build_kb_with_reminders(
     )
 
     kb_builder.row(*buttons_with_reminders, width=1)
-    kb_builder.row(
-        *[bt_previous_page, bt_number_showed_reminders, bt_next_page], width=3
+    # Кнопки для навигации по списку
+    _add_navigation(
+        kb_builder, pos_first_elem, limit, page_size, total_reminders, page_picker
     )
     kb_builder.row(*[bt_edit, bt_cancel], width=2)
 
@@ -136,7 +209,9 @@ class ListRemindersEditorCallbackFactory(CallbackData, prefix="del"):
     reminder_id: int
 
 
-# Билдер клавиатуры с кнопками для удаления заметок из списка
+# Билдер клавиатуры с кнопками для удаления заметок из списка (reminders -
+# только заметки показываемой страницы, selected - id отмеченных для удаления
+# заметок со всех страниц)
 def build_kb_to_edit_list_reminders(
     user_id: int,
     reminders: List[Record],
@@ -144,6 +219,9 @@ def build_kb_to_edit_list_reminders(
     page_size: int = 10,
     with_date: bool = False,
     with_time: bool = False,
+    selected: Collection[int] = (),
+    total_reminders: int = 0,
+    page_picker: bool = False,
 ) -> InlineKeyboardMarkup:
     kb_builder: InlineKeyboardBuilder = InlineKeyboardBuilder()
 
@@ -151,64 +229,44 @@ def build_kb_to_edit_list_reminders(
     # то на кнопках будут указаны их время. Если нужно вывести все заметки,
     # то будут указаны даты
     buttons_to_delete_reminders: List[InlineKeyboardButton] = []
-    limit = pos_first_elem + page_size
-    if len(reminders) < limit:
-        limit = len(reminders)
-
-    for num in range(pos_first_elem, limit):
-        button_text: str = "❌ "
-        if with_date:
-            reminder_date: date = reminders[num]["reminder_date"]
-            button_text += reminder_date.strftime("%d.%m.%Y") + " "
-        if with_time:
-            reminder_time: time = reminders[num]["reminder_time"]
-            button_text += reminder_time.strftime("%H:%M") + " "
-
-        msg_type: str = reminders[num]["msg_type"]
-
-        if msg_type != "text":
-            button_text += msg_type + " "
-        if (msg_type not in {"voice", "video_note"}) and (
-            reminders[num]["reminder_text"] is not None
-        ):
-            button_text += reminders[num]["reminder_text"][:100]
+    limit: int = pos_first_elem + len(reminders)
 
+    selected_ids: Set[int] = set(selected)
+
+    for reminder in reminders:
+        mark: str = "✅ " if reminder["reminder_id"] in selected_ids else "❌ "
         button: InlineKeyboardButton = InlineKeyboardButton(
-            text=button_text,
+            text=mark + _reminder_label(reminder, with_date, with_time),
             callback_data=ListRemindersEditorCallbackFactory(
-                user_id=user_id, reminder_id=reminders[num]["reminder_id"]
+                user_id=user_id, reminder_id=reminder["reminder_id"]
             ).pack(),
         )
 
         buttons_to_delete_reminders.append(button)
 
-    # Теперь создадим кнопки для навигации по списку
-    bt_previous_page: InlineKeyboardButton = InlineKeyboardButton(
-        text=LEXICON_RU["previous_page"], callback_data=LEXICON_RU["previous_page_cb"]
-    )
-    bt_next_page: InlineKeyboardButton = InlineKeyboardButton(
-        text=LEXICON_RU["next_page"], callback_data=LEXICON_RU["next_page_cb"]
-    )
-    bt_number_showed_reminders: InlineKeyboardButton = InlineKeyboardButton(
-        text=str(pos_first_elem) + " - " + str(limit),
-        callback_data=str(pos_first_elem) + "-" + str(limit),
-    )
-
-    # Последние кнопка - ОТМЕНА
+    # Последние кнопки - УДАЛИТЬ ВЫБРАННЫЕ (если что-то выбрано) и ОТМЕНА
     bt_cancel: InlineKeyboardButton = InlineKeyboardButton(
         text=LEXICON_RU["cancel_bt_text"], callback_data=LEXICON_RU["cancel_cb"]
     )
 
     kb_builder.row(*buttons_to_delete_reminders, width=1)
-    kb_builder.row(
-        *[bt_previous_page, bt_number_showed_reminders, bt_next_page], width=3
+    # Кнопки для навигации по списку
+    _add_navigation(
+        kb_builder, pos_first_elem, limit, page_size, total_reminders, page_picker
     )
+    if selected:
+        bt_delete_selected: InlineKeyboardButton = InlineKeyboardButton(
+            text=LEXICON_RU["delete_selected"] + f" ({len(selected)})",
+            callback_data=LEXICON_RU["delete_selected_cb"],
+        )
+        kb_builder.row(bt_delete_selected, width=1)
     kb_builder.row(bt_cancel, width=1)
 
     return kb_builder.as_markup(resize_keyboard=True)
 
 
 # Клавиатура, которая присылается для просмотра одной заметки
+@lru_cache(maxsize=None)
 def build_kb_with_reminder() -> InlineKeyboardMarkup:
     kb_builder: InlineKeyboardBuilder = InlineKeyboardBuilder()
 
@@ -238,6 +296,7 @@ def build_kb_with_reminder() -> InlineKeyboardMarkup:
 
 
 # Клавиатура, которая присылается для редактирования одной заметки
+@lru_cache(maxsize=None)
 def build_kb_to_edit_one_reminder() -> InlineKeyboardMarkup:
     kb_builder: InlineKeyboardBuilder = InlineKeyboardBuilder()
 
@@ -265,6 +324,7 @@ def build_kb_to_edit_one_reminder() -> InlineKeyboardMarkup:
     return kb_builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def kb_with_cancel_button() -> InlineKeyboardMarkup:
     kb_builder: InlineKeyboardBuilder = InlineKeyboardBuilder()
 
@@ -106,7 +106,11 @@ LEXICON_RU: dict[str, str] = {
     " заметку, просто напишите мне;)",
     "view_all_reminders": "Вот список всех ваших заметок",
     "number_showed_reminders": "Всего заметок показано: ",
-    "what_reminders_delete": "Нажмите на заметки, которые хотите удалить.",
+    "what_reminders_delete": "Отметьте заметки, которые хотите удалить,"
+    " и нажмите УДАЛИТЬ ВЫБРАННЫЕ.",
+    "delete_selected": "УДАЛИТЬ ВЫБРАННЫЕ",
+    "delete_selected_cb": "delete_selected_cb",
+    "reminders_were_deleted": "Удалено заметок: ",
     "not_understand": "Извините, я вас не понимаю 😕\n",
     "payment_title": "Оплата премиума",
     "payment_description": "Премиум навсегда снимает всякие ограничения на сохранение"
@@ -5,5 +5,5 @@
 """
 
 from .db_middleware import DataBaseMiddleware
-from .other_middlewares import ProviderTokenMiddleware, TodayRemindersMiddleware
+from .other_middlewares import ProviderTokenMiddleware, UserLimitsMiddleware
 from .scheduler_middleware import SchedulerMiddleware
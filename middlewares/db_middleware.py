@@ -22,6 +22,9 @@ class DataBaseMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async with self.pool.acquire() as connect:
-            data["database"] = DataBaseClass(connect)
-            return await handler(event, data)
+        # Подключение не берется на весь хэндлер: каждый запрос берет его из
+        # пула только на время своего выполнения. Хэндлеры без запросов к бд
+        # подключение не занимают совсем, а ответы пользователю (сетевые
+        # запросы к Telegram) не держат подключение занятым
+        data["database"] = DataBaseClass(self.pool)
+        return await handler(event, data)
@@ -7,13 +7,14 @@ from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 
-from database import TodayRemindersClass
+from database import UserLimitsCacheClass
 
 
-# Миддлварь, которая будет пробрасывать в хэндлеры объект TodayRemindersClass
-class TodayRemindersMiddleware(BaseMiddleware):
-    def __init__(self, today_reminders: TodayRemindersClass):
-        self.today_reminders = today_reminders
+# Миддлварь, которая будет пробрасывать в хэндлеры кэш премиум-статуса
+# и количества заметок пользователей
+class UserLimitsMiddleware(BaseMiddleware):
+    def __init__(self, user_limits: UserLimitsCacheClass):
+        self.user_limits = user_limits
 
     async def __call__(
         self,
@@ -21,7 +22,7 @@ class TodayRemindersMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        data["today_reminders"] = self.today_reminders
+        data["user_limits"] = self.user_limits
         return await handler(event, data)
 
 
@@ -2,7 +2,17 @@
 Пакет с модулями для реализации какой-то бизнес-логики бота.
 """
 
+from .delivery import RemindersDelivery
+from .fsm_sessions import plan_interval_sweep_fsm_sessions
 from .get_today_list_reminders import (
-    plan_cron_save_today_reminders,
-    plan_date_save_today_reminders,
+    plan_date_load_reminders,
+    plan_interval_load_reminders,
 )
+from .partitions import (
+    maintain_reminders_partitions,
+    plan_cron_maintain_reminders_partitions,
+)
+from .reminders_listener import RemindersListener
+from .reminders_paginator import RemindersPaginator
+from .stats import plan_interval_log_stats
+from .user_limits_listener import UserLimitsListener
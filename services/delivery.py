@@ -0,0 +1,254 @@
+"""
+Модуль с конвейером доставки напоминаний пользователям.
+
+Заметки, время которых наступило, попадают в очереди по чатам. Ограниченное
+число воркеров забирает готовые к отправке чаты, соблюдая общий лимит
+Telegram (token bucket) и паузу между сообщениями в один чат. При ответе 429
+(TelegramRetryAfter) откладывается только тот чат, которому он пришел.
+"""
+
+import asyncio
+import logging
+import time as time_module
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Set
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from asyncpg import Record
+
+from database import DeliveredRemindersClass
+
+# Общий лимит Telegram - около 30 сообщений в секунду
+GLOBAL_RATE: float = 30.0
+# Пауза между сообщениями в один чат (в секундах)
+PER_CHAT_INTERVAL: float = 1.0
+# Количество одновременно отправляющих воркеров
+WORKERS_NUMBER: int = 16
+# Максимальное число заметок в очереди. Если очередь заполнена, диспетчер
+# ждет, пока в ней освободится место
+MAX_PENDING: int = 10000
+# Сколько раз повторяем отправку при сетевых ошибках и ошибках сервера
+MAX_ATTEMPTS: int = 5
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не больше rate событий в секунду, с запасом capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else rate
+        self._tokens: float = self.capacity
+        self._updated_at: float = time_module.monotonic()
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now: float = time_module.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RemindersDelivery:
+    def __init__(
+        self,
+        bot: Bot,
+        delivered: DeliveredRemindersClass,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_interval: float = PER_CHAT_INTERVAL,
+        workers_number: int = WORKERS_NUMBER,
+        max_pending: int = MAX_PENDING,
+    ):
+        self.bot: Bot = bot
+        self.delivered: DeliveredRemindersClass = delivered
+
+        self.per_chat_interval: float = per_chat_interval
+        self.workers_number: int = workers_number
+        self._bucket: TokenBucket = TokenBucket(global_rate)
+        self._pending_slots: asyncio.Semaphore = asyncio.Semaphore(max_pending)
+
+        # chat_id -> очередь заметок этого чата
+        self._chats: Dict[int, Deque[Record]] = {}
+        # Чаты, из которых можно отправлять прямо сейчас
+        self._ready: asyncio.Queue = asyncio.Queue()
+        # Чаты, которые уже стоят в очереди, отправляются или ждут паузы
+        self._busy_chats: Set[int] = set()
+        # Сколько попыток отправки уже сделано для заметки
+        self._attempts: Dict[int, int] = {}
+
+        self._workers: List[asyncio.Task] = []
+
+        # Статистика
+        self._pending: int = 0
+        self._sent: int = 0
+        self._failed: int = 0
+        self._retried: int = 0
+        self._last_lag: float = 0.0
+        self._max_lag: float = 0.0
+
+    # Запускаем воркеров (нужен запущенный event loop)
+    def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers_number)
+            ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # Ставим заметку в очередь на отправку
+    async def put(self, reminder: Record):
+        await self._pending_slots.acquire()
+        self._pending += 1
+
+        chat_id: int = reminder["user_id"]
+        self._chats.setdefault(chat_id, deque()).append(reminder)
+
+        if chat_id not in self._busy_chats:
+            self._busy_chats.add(chat_id)
+            self._ready.put_nowait(chat_id)
+
+    # Текущее состояние очереди доставки
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queue_depth": self._pending,
+            "chats_waiting": len(self._busy_chats),
+            "sent": self._sent,
+            "failed": self._failed,
+            "retried": self._retried,
+            "last_lag_sec": round(self._last_lag, 3),
+            "max_lag_sec": round(self._max_lag, 3),
+            "awaiting_delete": len(self.delivered),
+        }
+
+    # Снова ставим чат в очередь готовых, если в нем остались заметки
+    def _release_chat(self, chat_id: int, delay: float):
+        if not self._chats.get(chat_id):
+            self._chats.pop(chat_id, None)
+            self._busy_chats.discard(chat_id)
+            return
+
+        asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id: int = await self._ready.get()
+            reminder: Record = self._chats[chat_id].popleft()
+            delay: float = self.per_chat_interval
+
+            try:
+                await self._bucket.acquire()
+                await self._send_appropriate_reminder(reminder)
+            except TelegramRetryAfter as error:
+                # Откладываем только этот чат, остальные продолжают отправляться
+                logging.warning(
+                    "Flood control for chat %s, retry after %s sec",
+                    str(chat_id),
+                    str(error.retry_after),
+                )
+                self._retried += 1
+                self._chats[chat_id].appendleft(reminder)
+                delay = max(float(error.retry_after), self.per_chat_interval)
+            except (TelegramNetworkError, TelegramServerError):
+                if self._retry(reminder):
+                    self._chats[chat_id].appendleft(reminder)
+                    delay = self.per_chat_interval * 2 ** self._attempts.get(
+                        reminder["reminder_id"], 1
+                    )
+                else:
+                    logging.exception(
+                        "Failed to send reminder %s", str(reminder["reminder_id"])
+                    )
+                    self._finish(reminder, sent=False)
+            except (TelegramForbiddenError, TelegramBadRequest):
+                # Пользователь заблокировал бота или сообщение некорректно -
+                # повторять бессмысленно
+                logging.exception(
+                    "Reminder %s can not be delivered", str(reminder["reminder_id"])
+                )
+                self._finish(reminder, sent=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception(
+                    "Failed to send reminder %s", str(reminder["reminder_id"])
+                )
+                self._finish(reminder, sent=False)
+            else:
+                self._finish(reminder, sent=True)
+            finally:
+                self._release_chat(chat_id, delay)
+
+    # Учитываем попытку отправки. Возвращаем True, если можно попробовать еще раз
+    def _retry(self, reminder: Record) -> bool:
+        attempts: int = self._attempts.get(reminder["reminder_id"], 0) + 1
+        self._attempts[reminder["reminder_id"]] = attempts
+        if attempts < MAX_ATTEMPTS:
+            self._retried += 1
+            return True
+        return False
+
+    # Заметка обработана (отправлена или отправить ее невозможно)
+    def _finish(self, reminder: Record, sent: bool):
+        reminder_id: int = reminder["reminder_id"]
+        self._attempts.pop(reminder_id, None)
+        self._pending -= 1
+        self._pending_slots.release()
+
+        if sent:
+            self._sent += 1
+            due_date: datetime = datetime.combine(
+                reminder["reminder_date"], reminder["reminder_time"]
+            )
+            self._last_lag = max((datetime.now() - due_date).total_seconds(), 0)
+            self._max_lag = max(self._max_lag, self._last_lag)
+        else:
+            self._failed += 1
+
+        # Напоминание удалится из бд вместе с другими отправленными
+        self.delivered.add(reminder_id)
+
+    async def _send_appropriate_reminder(self, reminder: Record):
+        logging.debug("Start sending reminder %s", str(reminder["reminder_id"]))
+        reminder_type: str = reminder["msg_type"]
+        user_id: int = reminder["user_id"]
+        file_id: str = reminder["file_id"]
+        reminder_text: str = reminder["reminder_text"]
+
+        # Отправляем сообщение пользователю
+        if reminder_type == "text":
+            await self.bot.send_message(user_id, reminder_text)
+        elif reminder_type == "photo":
+            await self.bot.send_photo(user_id, photo=file_id, caption=reminder_text)
+        elif reminder_type == "video":
+            await self.bot.send_video(user_id, video=file_id, caption=reminder_text)
+        elif reminder_type == "audio":
+            await self.bot.send_audio(user_id, audio=file_id, caption=reminder_text)
+        elif reminder_type == "document":
+            await self.bot.send_document(
+                user_id, document=file_id, caption=reminder_text
+            )
+        elif reminder_type == "voice":
+            await self.bot.send_voice(user_id, voice=file_id)
+        elif reminder_type == "video_note":
+            await self.bot.send_video_note(user_id, video_note=file_id)
@@ -0,0 +1,196 @@
+"""
+Модуль с отправкой напоминаний отдельно от обработки апдейтов.
+
+DeliveryWorker собирает все, что нужно для отправки: расписание ближайших
+заметок, его загрузку и обновление по уведомлениям, конвейер доставки,
+удаление отправленных заметок и обслуживание секций. Его запускает либо
+bot.py (вместе с polling), либо отдельный процесс:
+    python -m services.delivery_worker
+Тогда bot.py запускается с DELIVERY_IN_BOT=false и только обрабатывает
+апдейты, а процессы отправки и обработки масштабируются независимо
+(процессов отправки может быть несколько, см. аренду заметок).
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from asyncpg import Connection
+from asyncpg.pool import Pool
+
+from config_data import Config, load_config
+from database import (
+    DeliveredRemindersClass,
+    TodayRemindersClass,
+    UserLimitsCacheClass,
+    apply_migrations,
+    connect,
+    create_pool,
+)
+from services import (
+    RemindersDelivery,
+    RemindersListener,
+    maintain_reminders_partitions,
+    plan_cron_maintain_reminders_partitions,
+    plan_date_load_reminders,
+    plan_interval_load_reminders,
+    plan_interval_log_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryWorker:
+    def __init__(
+        self,
+        bot: Bot,
+        pool: Pool,
+        scheduler: AsyncIOScheduler,
+        user_limits: UserLimitsCacheClass,
+        journal_path: str,
+        catch_up_grace: float,
+    ):
+        self.bot: Bot = bot
+        self.pool: Pool = pool
+        self.scheduler: AsyncIOScheduler = scheduler
+        self.user_limits: UserLimitsCacheClass = user_limits
+        self.catch_up_grace: float = catch_up_grace
+
+        # Ближайшие заметки передает на отправку встроенный диспетчер,
+        # APScheduler выполняет только служебные задачи
+        self.today_reminders: TodayRemindersClass = TodayRemindersClass()
+        # Отправленные заметки удаляются из бд пачками
+        self.delivered: DeliveredRemindersClass = DeliveredRemindersClass(
+            pool=pool,
+            today_reminders=self.today_reminders,
+            journal_path=journal_path,
+            user_limits=user_limits,
+        )
+        # Конвейер доставки с ограничением скорости отправки
+        self.delivery: RemindersDelivery = RemindersDelivery(
+            bot=bot, delivered=self.delivered
+        )
+        # Изменения заметок (из любого процесса бота) применяются к расписанию
+        # по уведомлениям из бд
+        self.listener: RemindersListener = RemindersListener(
+            pool=pool, today_reminders=self.today_reminders
+        )
+
+    # Готовим бд и расписание и планируем служебные задачи. Задачи начнут
+    # выполняться после запуска планировщика
+    async def start(self):
+        # Заметки, пропущенные во время простоя, отправим, если с их времени
+        # прошло не больше catch_up_grace минут. Остальные удалим
+        catch_up_since: datetime = datetime.now() - timedelta(
+            minutes=self.catch_up_grace
+        )
+        # Секции прошедших дней удаляются, только когда их заметки уже
+        # не отправит ни догоняющая отправка, ни процесс, который держит
+        # их в аренде
+        keep_grace: timedelta = (
+            timedelta(minutes=self.catch_up_grace) + self.today_reminders.claim_lease
+        )
+        # Создадим секции таблицы Reminders на ближайшие дни и удалим секции
+        # прошедших дней (если бот не работал в полночь)
+        await maintain_reminders_partitions(
+            pool=self.pool, user_limits=self.user_limits, keep_grace=keep_grace
+        )
+        # До загрузки ближайших заметок удалим заметки, которые были
+        # отправлены, но не удалены до перезапуска
+        await self.delivered.start()
+        # Подписываемся на уведомления до первой загрузки окна
+        await self.listener.start()
+
+        # Расписание держит в памяти только ближайшие заметки и регулярно
+        # дозагружает их из бд
+        plan_date_load_reminders(
+            scheduler=self.scheduler,
+            pool=self.pool,
+            today_reminders=self.today_reminders,
+            delivery=self.delivery,
+            catch_up_since=catch_up_since,
+        )
+        plan_interval_load_reminders(
+            scheduler=self.scheduler,
+            pool=self.pool,
+            today_reminders=self.today_reminders,
+        )
+        plan_cron_maintain_reminders_partitions(
+            scheduler=self.scheduler,
+            pool=self.pool,
+            user_limits=self.user_limits,
+            keep_grace=keep_grace,
+        )
+
+        self.delivery.start()
+        self.today_reminders.start(send=self.delivery.put)
+
+    async def stop(self):
+        logger.info("Stop reminders listener")
+        await self.listener.stop()
+        logger.info("Stop reminders dispatcher")
+        await self.today_reminders.stop()
+        logger.info("Stop reminders delivery")
+        await self.delivery.stop()
+        logger.info("Delete delivered reminders")
+        await self.delivered.close()
+
+
+# Процесс, который только отправляет напоминания (без polling)
+async def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(filename)s:%(lineno)d #%(levelname)-8s "
+        "[%(asctime)s] - %(name)s - %(message)s",
+    )
+
+    logger.info("Starting delivery worker")
+
+    config: Config = load_config(None)
+    bot: Bot = Bot(
+        token=config.tg_bot.token, default=DefaultBotProperties(parse_mode="HTML")
+    )
+    worker: DeliveryWorker | None = None
+
+    try:
+        migrations_connection: Connection = await connect(config.con_pool)
+        try:
+            await apply_migrations(migrations_connection)
+        finally:
+            await migrations_connection.close()
+        pool: Pool = await create_pool(config.con_pool)
+
+        scheduler: AsyncIOScheduler = AsyncIOScheduler()
+        user_limits: UserLimitsCacheClass = UserLimitsCacheClass()
+        worker = DeliveryWorker(
+            bot=bot,
+            pool=pool,
+            scheduler=scheduler,
+            user_limits=user_limits,
+            journal_path=config.delivery.journal_path,
+            catch_up_grace=config.delivery.catch_up_grace,
+        )
+        await worker.start()
+        plan_interval_log_stats(
+            scheduler=scheduler,
+            pool=pool,
+            delivery=worker.delivery,
+            user_limits=user_limits,
+            listener=worker.listener,
+            fsm_storage=None,
+        )
+        scheduler.start()
+
+        # Работаем, пока процесс не остановят
+        await asyncio.Event().wait()
+    finally:
+        if worker is not None:
+            await worker.stop()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""
+Модуль с периодической очисткой хранилища состояний FSM от сессий,
+к которым давно не обращались (см. utils/fsm_storage.py).
+"""
+
+import logging
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from utils import BoundedMemoryStorage
+
+# Как часто удалять просроченные сессии (в минутах)
+SWEEP_INTERVAL: int = 5
+
+
+def plan_interval_sweep_fsm_sessions(
+    scheduler: AsyncIOScheduler, storage: BoundedMemoryStorage
+):
+    scheduler.add_job(
+        _sweep_fsm_sessions,
+        trigger="interval",
+        id="sweep_fsm_sessions",
+        minutes=SWEEP_INTERVAL,
+        kwargs={"storage": storage},
+    )
+
+
+async def _sweep_fsm_sessions(storage: BoundedMemoryStorage):
+    expired: int = storage.sweep()
+    if expired:
+        logging.info("FSM storage: %d idle sessions expired", expired)
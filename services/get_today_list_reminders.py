@@ -1,57 +1,209 @@
-from datetime import datetime
-from typing import List
+"""
+Модуль с загрузкой ближайших заметок в расписание.
+
+Вместо выгрузки всего дня в полночь расписание держит в памяти только
+заметки на LOAD_WINDOW вперед и каждые LOAD_INTERVAL секунд дозагружает окно
+запросом по диапазону времени. Так в расписание попадают и заметки,
+добавленные в бд другими процессами.
+
+При запуске заметки, время которых прошло, пока бот не работал (но не раньше
+чем catch_up_grace назад), отправляются через общий конвейер доставки. Они
+читаются из бд пачками короткими запросами по ключу последней заметки пачки.
+
+Заметки загружаются с арендой (см. TodayRemindersClass), поэтому процессов
+бота может быть несколько: заметку отправляет тот, кто держит ее в аренде.
+Доставка гарантируется не меньше одного раза: если процесс упал во время
+отправки, заметку после окончания аренды отправит другой процесс. То же
+с отправленными, но еще не удаленными заметками, если журнал упавшего
+процесса недоступен остальным (см. DeliveredRemindersClass).
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import List, Set, Tuple
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from asyncpg import Record
 from asyncpg.pool import Pool
 
 from database import (
+    CLAIM_LEASE,
     DataBaseClass,
     TodayRemindersClass,
+    claim_reminders,
+    claim_reminders_in_window,
     delete_irrelevant_reminders,
-    get_today_reminders,
+    get_reminder_key,
+    get_reminders_keys_in_window,
+    renew_reminders_claims,
 )
 
+from .delivery import RemindersDelivery
+
+# Как часто дозагружается окно (в секундах)
+LOAD_INTERVAL: int = 60
+# Насколько вперед загружаются заметки
+LOAD_WINDOW: timedelta = timedelta(minutes=15)
+# Насколько назад захватывается окно: заметки, добавленные другими процессами
+# на только что наступившее время, и заметки упавшего процесса (после
+# окончания их аренды) отправятся со следующей загрузкой
+LOAD_SLACK: timedelta = CLAIM_LEASE + timedelta(seconds=2 * LOAD_INTERVAL)
+# Сколько заметок процесс берет в аренду за одну загрузку. Остальные
+# достанутся другим процессам или следующей загрузке
+CLAIM_BATCH_SIZE: int = 5000
+# По сколько пропущенных заметок читается и берется в аренду за раз
+CATCH_UP_CHUNK_SIZE: int = 500
+
 
-def plan_cron_save_today_reminders(
+def plan_interval_load_reminders(
     scheduler: AsyncIOScheduler, pool: Pool, today_reminders: TodayRemindersClass
 ):
     scheduler.add_job(
-        _save_list_today_reminders,
-        trigger="cron",
-        id="get_today_list_cron",
-        hour=0,
-        minute=0,
+        _load_reminders,
+        trigger="interval",
+        id="load_reminders_interval",
+        seconds=LOAD_INTERVAL,
         kwargs={"pool": pool, "today_reminders": today_reminders},
     )
 
 
-def plan_date_save_today_reminders(
-    scheduler: AsyncIOScheduler, pool: Pool, today_reminders: TodayRemindersClass
+def plan_date_load_reminders(
+    scheduler: AsyncIOScheduler,
+    pool: Pool,
+    today_reminders: TodayRemindersClass,
+    delivery: RemindersDelivery,
+    catch_up_since: datetime,
 ):
     scheduler.add_job(
-        _save_list_today_reminders,
+        _first_load_reminders,
         trigger="date",
-        id="get_today_list_date",
+        id="load_reminders_date",
         run_date=datetime.now(),
-        kwargs={"pool": pool, "today_reminders": today_reminders},
+        kwargs={
+            "pool": pool,
+            "today_reminders": today_reminders,
+            "delivery": delivery,
+            "catch_up_since": catch_up_since,
+        },
+    )
+
+
+# При запуске удалим заметки, время которых прошло раньше catch_up_since,
+# загрузим первое окно и отправим заметки, пропущенные во время простоя
+async def _first_load_reminders(
+    pool: Pool,
+    today_reminders: TodayRemindersClass,
+    delivery: RemindersDelivery,
+    catch_up_since: datetime,
+):
+    now: datetime = datetime.now()
+    await delete_irrelevant_reminders(DataBaseClass(pool), before=catch_up_since)
+    await _load_reminders(pool, today_reminders, now=now)
+    # Пропущенные заметки заканчиваются там, где начинается первое окно,
+    # поэтому ни одна заметка не попадет и в окно, и в догоняющую отправку
+    await _catch_up_reminders(
+        pool, today_reminders, delivery, catch_up_since, now - LOAD_SLACK
     )
 
 
-# Функция, которая ежедневно в 00:00 выгружает список всех заметок
-# в словарь | список (пока не решил как удобнее).
-async def _save_list_today_reminders(pool: Pool, today_reminders: TodayRemindersClass):
-    async with pool.acquire() as connection:
-        # Очистим список заметок (на всякий случай)
-        today_reminders.clear()
+# Передаем в конвейер доставки заметки со временем отправки
+# в [since, until). Конвейер ограничивает скорость отправки, а его
+# ограниченная очередь не дает прочитать больше, чем успеваем отправить.
+# Каждая пачка сначала берется в аренду: заметки, которые уже отправляет
+# другой процесс, пропускаются. Подключение берется только на время
+# запросов пачки, поэтому ожидание очереди его не занимает
+async def _catch_up_reminders(
+    pool: Pool,
+    today_reminders: TodayRemindersClass,
+    delivery: RemindersDelivery,
+    since: datetime,
+    until: datetime,
+):
+    if since >= until:
+        return
+
+    database: DataBaseClass = DataBaseClass(pool)
+    caught_up: int = 0
+    after: Tuple[date, time, int] | None = None
+    while True:
+        rows: List[Record] = await get_reminders_keys_in_window(
+            database, since, until, after, CATCH_UP_CHUNK_SIZE
+        )
+        if not rows:
+            break
+        after = get_reminder_key(rows[-1])
+
+        now: datetime = datetime.now()
+        claimed: List[Record] = await claim_reminders(
+            database,
+            [row["reminder_id"] for row in rows],
+            today_reminders.owner,
+            now,
+            now + today_reminders.claim_lease,
+        )
+        # Аренда этих заметок продлевается вместе с заметками расписания
+        today_reminders.add_in_flight(reminder["reminder_id"] for reminder in claimed)
+        # UPDATE возвращает заметки в произвольном порядке
+        for reminder in sorted(claimed, key=get_reminder_key):
+            await delivery.put(reminder)
+        caught_up += len(claimed)
+
+        if len(rows) < CATCH_UP_CHUNK_SIZE:
+            break
+
+    if caught_up:
+        logging.info("Caught up %d reminders missed since %s", caught_up, since)
 
-        database: DataBaseClass = DataBaseClass(connection)
-        # Удалим неактуальные заметки
-        await delete_irrelevant_reminders(database)
-        # Получим заметки на сегодня из базы данных
-        new_rows: List[Record] = await get_today_reminders(database)
-        # Добавим в хранилище сегодняшних заметок
-        today_reminders.push(new_rows)
 
-        # Проверка работы
-        today_reminders.print()
+# Продлеваем аренду заметок расписания и берем в аренду заметки со временем
+# отправки в [сейчас - LOAD_SLACK, сейчас + LOAD_WINDOW), которые не арендованы
+# другими процессами. Уже запланированные заметки не дублируются
+async def _load_reminders(
+    pool: Pool, today_reminders: TodayRemindersClass, now: datetime | None = None
+):
+    now = now or datetime.now()
+    window_end: datetime = now + LOAD_WINDOW
+    claimed_until: datetime = now + today_reminders.claim_lease
+    database: DataBaseClass = DataBaseClass(pool)
+
+    claimed_ids: List[int] = today_reminders.claimed_ids()
+    if claimed_ids:
+        renewed: Set[int] = set(
+            await renew_reminders_claims(
+                database, claimed_ids, today_reminders.owner, claimed_until
+            )
+        )
+        # Аренду не продлить, если заметку удалили или ее забрал другой процесс
+        # (аренда истекла, например, из-за долгой паузы). Тогда ее не отправляем
+        lost: List[int] = [
+            reminder_id
+            for reminder_id in claimed_ids
+            if reminder_id not in renewed and reminder_id in today_reminders
+        ]
+        if lost:
+            logging.warning("Lost claims on %d reminders", len(lost))
+            today_reminders.delete_many(lost)
+
+    today_reminders.begin_load()
+    try:
+        new_rows: List[Record] = await claim_reminders_in_window(
+            database,
+            now - LOAD_SLACK,
+            window_end,
+            today_reminders.owner,
+            now,
+            claimed_until,
+            CLAIM_BATCH_SIZE,
+        )
+    except Exception:
+        today_reminders.cancel_load()
+        raise
+
+    scheduled: int = len(today_reminders)
+    today_reminders.finish_load(new_rows, window_end)
+    logging.debug(
+        "Loaded %d new reminders until %s (%d scheduled)",
+        len(today_reminders) - scheduled,
+        window_end,
+        len(today_reminders),
+    )
@@ -0,0 +1,79 @@
+"""
+Модуль с обслуживанием секций таблицы Reminders (см. миграцию 4).
+
+Раз в сутки (и при запуске бота) создаются секции на несколько дней вперед,
+а секции прошедших дней удаляются целиком. Секция удаляется только после
+того, как ее заметки не может отправить ни одна загрузка: в полночь заметки
+на 23:5x могут еще ждать в очереди доставки или быть в аренде, поэтому
+секции дней, которые закончились меньше чем keep_grace назад, остаются
+до следующего обслуживания. Если процессов отправки несколько,
+секции обслуживает тот, кто первым взял advisory-блокировку, остальные
+в этот раз обслуживание пропускают.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from asyncpg.pool import Pool
+
+from database import (
+    DataBaseClass,
+    UserLimitsCacheClass,
+    drop_expired_reminders_partitions,
+    ensure_reminders_partitions,
+    lock_reminders_partitions,
+    unlock_reminders_partitions,
+)
+
+# На сколько дней вперед создаются секции
+PARTITIONS_DAYS_AHEAD: int = 14
+
+
+def plan_cron_maintain_reminders_partitions(
+    scheduler: AsyncIOScheduler,
+    pool: Pool,
+    user_limits: UserLimitsCacheClass,
+    keep_grace: timedelta,
+):
+    scheduler.add_job(
+        maintain_reminders_partitions,
+        trigger="cron",
+        id="maintain_reminders_partitions",
+        hour=0,
+        minute=0,
+        kwargs={"pool": pool, "user_limits": user_limits, "keep_grace": keep_grace},
+    )
+
+
+# Создаем секции на ближайшие дни и удаляем секции дней, которые
+# закончились раньше, чем keep_grace назад
+async def maintain_reminders_partitions(
+    pool: Pool,
+    user_limits: UserLimitsCacheClass | None = None,
+    keep_grace: timedelta = timedelta(0),
+):
+    today: date = date.today()
+    keep_since: date = (datetime.now() - keep_grace).date()
+    async with DataBaseClass(pool).acquire() as database:
+        if not await lock_reminders_partitions(database):
+            logging.info("Reminders partitions are maintained by another process")
+            return
+
+        try:
+            created: int = await ensure_reminders_partitions(
+                database, today, PARTITIONS_DAYS_AHEAD
+            )
+            dropped: int = await drop_expired_reminders_partitions(
+                database, min(keep_since, today)
+            )
+        finally:
+            await unlock_reminders_partitions(database)
+
+    # Счетчики заметок владельцев удаленных заметок уменьшились в бд
+    if dropped and user_limits is not None:
+        user_limits.clear()
+
+    logging.info(
+        "Reminders partitions: %d created, %d expired dropped", created, dropped
+    )
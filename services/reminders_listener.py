@@ -0,0 +1,197 @@
+"""
+Модуль с обновлением расписания по уведомлениям об изменении заметок.
+
+Триггеры из миграции 6 отправляют в канал reminders_changed уведомление
+на каждое добавление, изменение и удаление заметки, кем бы оно ни было
+сделано. Каждый процесс бота слушает канал на одном подключении из общего
+пула и сразу применяет изменения к своему расписанию: заметки из окна берет
+в аренду и ставит в расписание, остальные из расписания убирает.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Set
+
+from asyncpg import Connection, Record
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from database import DataBaseClass, TodayRemindersClass, claim_reminders
+
+# Канал уведомлений (см. функцию reminders_notify_change в миграции 6)
+REMINDERS_CHANNEL: str = "reminders_changed"
+# Пауза перед повторным подключением после потери соединения (в секундах)
+RECONNECT_DELAY: float = 5.0
+
+
+class RemindersListener:
+    def __init__(self, pool: Pool, today_reminders: TodayRemindersClass):
+        self.pool: Pool = pool
+        self.today_reminders: TodayRemindersClass = today_reminders
+
+        # Подключение, на котором выполнен LISTEN (занято все время работы)
+        self._connection: Optional[PoolConnectionProxy] = None
+        # Уведомления обрабатываются по порядку отдельной задачей: обработка
+        # обращается к бд, а колбэк asyncpg должен быть синхронным
+        self._notifications: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._reconnecting: Optional[asyncio.Task] = None
+
+        # Статистика
+        self._received: int = 0
+        self._reconnects: int = 0
+
+    # Подписываемся на уведомления (до первой загрузки окна, чтобы
+    # не пропустить изменения между загрузкой и подпиской)
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._process())
+        await self._listen()
+
+    async def stop(self):
+        for task in (self._reconnecting, self._worker):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._reconnecting = None
+        self._worker = None
+        await self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "listening": self._connection is not None,
+            "received": self._received,
+            "queued": self._notifications.qsize(),
+            "reconnects": self._reconnects,
+        }
+
+    async def _listen(self):
+        connection: PoolConnectionProxy = await self.pool.acquire()
+        try:
+            await connection.add_listener(REMINDERS_CHANNEL, self._on_notification)
+        except Exception:
+            await self.pool.release(connection)
+            raise
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+
+    async def _release(self):
+        connection: Optional[PoolConnectionProxy] = self._connection
+        self._connection = None
+        if connection is None:
+            return
+
+        try:
+            connection.remove_termination_listener(self._on_termination)
+            await connection.remove_listener(REMINDERS_CHANNEL, self._on_notification)
+        except Exception:
+            logging.debug("Listener connection is already closed")
+        await self.pool.release(connection)
+
+    def _on_notification(
+        self, connection: Connection, pid: int, channel: str, payload: str
+    ):
+        self._received += 1
+        self._notifications.put_nowait(json.loads(payload))
+
+    # Соединение потеряно: пока переподключаемся, уведомления не приходят,
+    # поэтому после переподключения сверим расписание с бд
+    def _on_termination(self, connection: Connection):
+        logging.warning("Reminders listener connection lost, reconnecting")
+        if self._reconnecting is None or self._reconnecting.done():
+            self._reconnecting = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        await self._release()
+        while True:
+            try:
+                await self._listen()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Failed to listen for reminders changes")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+        self._reconnects += 1
+        await self._resync()
+
+    # Сверяем запланированные заметки с бд: изменения за время без подписки
+    # могли быть пропущены. Новые заметки окна заберет следующая загрузка
+    async def _resync(self):
+        scheduled: List[int] = list(self.today_reminders.today_reminders)
+        if not scheduled:
+            return
+
+        now: datetime = datetime.now()
+        claimed: List[Record] = await claim_reminders(
+            DataBaseClass(self.pool),
+            scheduled,
+            self.today_reminders.owner,
+            now,
+            now + self.today_reminders.claim_lease,
+        )
+        claimed_ids: Set[int] = {reminder["reminder_id"] for reminder in claimed}
+        self.today_reminders.delete_many(
+            reminder_id for reminder_id in scheduled if reminder_id not in claimed_ids
+        )
+        for reminder in claimed:
+            self.today_reminders.reschedule(reminder)
+
+    # Обрабатываем уведомления пачками: все накопившиеся к моменту обработки
+    # заметки из окна берутся в аренду одним запросом
+    async def _process(self):
+        while True:
+            notifications: List[Dict[str, Any]] = [await self._notifications.get()]
+            while not self._notifications.empty():
+                notifications.append(self._notifications.get_nowait())
+
+            try:
+                await self._apply(notifications)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception(
+                    "Failed to apply %d reminders changes", len(notifications)
+                )
+
+    async def _apply(self, notifications: List[Dict[str, Any]]):
+        # Для каждой заметки важно только последнее уведомление
+        latest: Dict[int, Dict[str, Any]] = {
+            notification["reminder_id"]: notification for notification in notifications
+        }
+
+        to_claim: List[int] = []
+        to_delete: List[int] = []
+        for reminder_id, notification in latest.items():
+            if notification["op"] != "DELETE" and self.today_reminders.in_window(
+                date.fromisoformat(notification["reminder_date"]),
+                time.fromisoformat(notification["reminder_time"]),
+            ):
+                to_claim.append(reminder_id)
+            else:
+                to_delete.append(reminder_id)
+
+        if to_delete:
+            self.today_reminders.delete_many(to_delete)
+        if not to_claim:
+            return
+
+        # Заметку, арендованную другим процессом, отправит он. Свои заметки
+        # берутся повторно - так приходит их новая версия
+        now: datetime = datetime.now()
+        claimed: List[Record] = await claim_reminders(
+            DataBaseClass(self.pool),
+            to_claim,
+            self.today_reminders.owner,
+            now,
+            now + self.today_reminders.claim_lease,
+        )
+        claimed_ids: Set[int] = {reminder["reminder_id"] for reminder in claimed}
+        # Заметки, которые забрал другой процесс, здесь больше не отправляются
+        self.today_reminders.delete_many(
+            reminder_id for reminder_id in to_claim if reminder_id not in claimed_ids
+        )
+        for reminder in claimed:
+            self.today_reminders.reschedule(reminder)
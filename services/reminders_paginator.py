@@ -0,0 +1,306 @@
+"""
+Модуль с постраничным показом списка заметок.
+
+RemindersPaginator - общий для режимов просмотра и удаления заметок: хранит
+в состоянии FSM курсор показанной страницы (позицию, id заметок и ключи
+первой и последней заметки, см. get_page_cursor), достает страницы из бд
+и рисует список. Листание идет по ключу заметки, переход на выбранную
+страницу (кнопки под кнопкой с номерами заметок) - по позиции. Если после
+действия ни текст, ни клавиатура сообщения не изменились, сообщение
+не редактируется.
+"""
+
+from datetime import date, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from asyncpg import Record
+
+from database import (
+    DataBaseClass,
+    count_reminders,
+    get_page_cursor,
+    get_reminder_key,
+    select_reminders_by_ids,
+    select_reminders_page,
+    select_reminders_page_at,
+)
+from keyboards import build_kb_to_edit_list_reminders, build_kb_with_reminders
+from lexicon import LEXICON_RU
+
+# Количество заметок на странице
+PAGE_SIZE: int = 10
+
+
+class RemindersPaginator:
+    def __init__(self, state: FSMContext, database: DataBaseClass, user_id: int):
+        self.state: FSMContext = state
+        self.database: DataBaseClass = database
+        self.user_id: int = user_id
+
+        # Данные списка из состояния FSM (читаются один раз за апдейт)
+        self._data: Optional[Dict[str, Any]] = None
+        # Заметки показываемой страницы, если они уже достаны из бд
+        self._page: Optional[List[Record]] = None
+
+    # Открываем список заметок на выбранную дату (None - всех заметок)
+    # с первой страницы
+    async def open(self, reminder_date: date | None, page_size: int = PAGE_SIZE):
+        page: List[Record] = await select_reminders_page(
+            connector=self.database,
+            user_id=self.user_id,
+            reminder_date=reminder_date,
+            page_size=page_size,
+        )
+        total_reminders: int = await count_reminders(
+            connector=self.database, user_id=self.user_id, reminder_date=reminder_date
+        )
+
+        self._data = {}
+        await self._set_page(
+            page,
+            0,
+            date_of_showed_reminders=reminder_date or date.today(),
+            show_all_reminders=reminder_date is None,
+            total_reminders=total_reminders,
+            page_size=page_size,
+            page_picker=False,
+            selected_to_delete=[],
+        )
+
+    async def total(self) -> int:
+        data: Dict[str, Any] = await self._get_data()
+        return data["total_reminders"]
+
+    # Листаем список вперед или назад. False - листать некуда
+    async def flip(self, forward: bool) -> bool:
+        data: Dict[str, Any] = await self._get_data()
+        pos_first_elem: int = data["pos_first_elem"]
+        page_size: int = data["page_size"]
+
+        page: List[Record] = []
+        # Страница, которая начинается после последней показанной заметки
+        if forward:
+            if (
+                pos_first_elem + page_size < data["total_reminders"]
+                and data["last_key"] is not None
+            ):
+                page = await select_reminders_page(
+                    connector=self.database,
+                    user_id=self.user_id,
+                    reminder_date=self._reminder_date(),
+                    page_size=page_size,
+                    after=data["last_key"],
+                )
+                pos_first_elem += page_size
+        # Страница, которая заканчивается перед первой показанной заметкой
+        elif pos_first_elem > 0 and data["first_key"] is not None:
+            page = await select_reminders_page(
+                connector=self.database,
+                user_id=self.user_id,
+                reminder_date=self._reminder_date(),
+                page_size=page_size,
+                before=data["first_key"],
+            )
+            pos_first_elem = max(pos_first_elem - page_size, 0)
+
+        if not page:
+            return False
+        await self._set_page(page, pos_first_elem)
+        return True
+
+    # Переходим на страницу, которая начинается с заметки под номером
+    # pos_first_elem. False - это уже показанная страница (или ее нет)
+    async def jump(self, pos_first_elem: int) -> bool:
+        data: Dict[str, Any] = await self._get_data()
+        if pos_first_elem == data["pos_first_elem"]:
+            return False
+
+        page: List[Record] = await select_reminders_page_at(
+            connector=self.database,
+            user_id=self.user_id,
+            reminder_date=self._reminder_date(),
+            page_size=data["page_size"],
+            pos_first_elem=pos_first_elem,
+        )
+        if not page:
+            return False
+        await self._set_page(page, pos_first_elem, page_picker=False)
+        return True
+
+    # Показываем или прячем выбор страницы
+    async def toggle_page_picker(self):
+        data: Dict[str, Any] = await self._get_data()
+        await self._update(page_picker=not data.get("page_picker", False))
+
+    # Отмечаем заметку для удаления (или снимаем отметку)
+    async def toggle_selected(self, reminder_id: int):
+        data: Dict[str, Any] = await self._get_data()
+        selected: List[int] = list(data.get("selected_to_delete", []))
+        if reminder_id in selected:
+            selected.remove(reminder_id)
+        else:
+            selected.append(reminder_id)
+        await self._update(selected_to_delete=selected)
+
+    async def clear_selected(self):
+        await self._update(selected_to_delete=[])
+
+    async def selected(self) -> List[int]:
+        data: Dict[str, Any] = await self._get_data()
+        return data.get("selected_to_delete", [])
+
+    # Заново достаем показанную страницу после удаления заметок deleted
+    async def refresh_after_delete(self, deleted: List[Record]):
+        data: Dict[str, Any] = await self._get_data()
+        first_key: Tuple[date, time, int] | None = data["first_key"]
+        pos_first_elem: int = data["pos_first_elem"]
+        page_size: int = data["page_size"]
+
+        page: List[Record] = []
+        if first_key is not None:
+            # Удаленные заметки с предыдущих страниц сдвигают текущую страницу
+            pos_first_elem = max(
+                pos_first_elem
+                - sum(1 for row in deleted if get_reminder_key(row) < first_key),
+                0,
+            )
+
+            # Показанная страница, начиная с ее первой заметки
+            page = await select_reminders_page(
+                connector=self.database,
+                user_id=self.user_id,
+                reminder_date=self._reminder_date(),
+                page_size=page_size,
+                start=first_key,
+            )
+            # Если удалили все заметки на странице - покажем предыдущую
+            if not page and pos_first_elem > 0:
+                page = await select_reminders_page(
+                    connector=self.database,
+                    user_id=self.user_id,
+                    reminder_date=self._reminder_date(),
+                    page_size=page_size,
+                    before=first_key,
+                )
+                pos_first_elem = max(pos_first_elem - page_size, 0)
+
+        await self._set_page(
+            page,
+            pos_first_elem,
+            total_reminders=max(data["total_reminders"] - len(deleted), 0),
+            selected_to_delete=[],
+        )
+
+    # Текст сообщения и клавиатура показанной страницы. editing - режим
+    # удаления заметок, text - текст вместо заголовка списка
+    async def render(
+        self, editing: bool = False, text: str | None = None
+    ) -> Tuple[str, InlineKeyboardMarkup]:
+        data: Dict[str, Any] = await self._get_data()
+        page: List[Record] = await self._get_page()
+        view_all_reminders: bool = data["show_all_reminders"]
+
+        markup: InlineKeyboardMarkup
+        if editing:
+            markup = build_kb_to_edit_list_reminders(
+                user_id=self.user_id,
+                reminders=page,
+                pos_first_elem=data["pos_first_elem"],
+                page_size=data["page_size"],
+                with_date=view_all_reminders,
+                with_time=not view_all_reminders,
+                selected=data.get("selected_to_delete", []),
+                total_reminders=data["total_reminders"],
+                page_picker=data.get("page_picker", False),
+            )
+        else:
+            markup = build_kb_with_reminders(
+                user_id=self.user_id,
+                reminders=page,
+                pos_first_elem=data["pos_first_elem"],
+                page_size=data["page_size"],
+                with_data=view_all_reminders,
+                with_time=not view_all_reminders,
+                total_reminders=data["total_reminders"],
+                page_picker=data.get("page_picker", False),
+            )
+
+        if text is None:
+            text = LEXICON_RU["what_reminders_delete"] if editing else self._title()
+        return text, markup
+
+    # Присылаем показанную страницу новым сообщением
+    async def send(
+        self, message: Message, editing: bool = False, text: str | None = None
+    ):
+        text, markup = await self.render(editing, text)
+        await message.answer(text=text, reply_markup=markup)
+
+    # Показываем страницу в сообщении, на кнопку которого нажал пользователь.
+    # False - сообщение уже такое (Telegram не дает изменить сообщение
+    # на такое же)
+    async def edit(
+        self, callback: CallbackQuery, editing: bool = False, text: str | None = None
+    ) -> bool:
+        text, markup = await self.render(editing, text)
+        message: Message = callback.message
+
+        same_markup: bool = (
+            message.reply_markup is not None
+            and message.reply_markup.inline_keyboard == markup.inline_keyboard
+        )
+        if message.text == text:
+            if same_markup:
+                return False
+            await message.edit_reply_markup(reply_markup=markup)
+        else:
+            await message.edit_text(text=text, reply_markup=markup)
+        return True
+
+    # Заголовок списка: все заметки, на сегодня, на завтра или на дату
+    def _title(self) -> str:
+        if self._data["show_all_reminders"]:
+            return LEXICON_RU["view_all_reminders"]
+
+        date_of_showed_reminders: date = self._data["date_of_showed_reminders"]
+        if date_of_showed_reminders == date.today():
+            return LEXICON_RU["today_msg"]
+        if date_of_showed_reminders == date.today() + timedelta(days=1):
+            return LEXICON_RU["tomorrow_msg"]
+        return LEXICON_RU[
+            "reminders_on_chosen_date_msg"
+        ] + date_of_showed_reminders.strftime("%d.%m.%Y")
+
+    def _reminder_date(self) -> date | None:
+        if self._data["show_all_reminders"]:
+            return None
+        return self._data["date_of_showed_reminders"]
+
+    async def _get_data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = await self.state.get_data()
+        return self._data
+
+    # Заметки показанной страницы. В состоянии хранятся только их id
+    async def _get_page(self) -> List[Record]:
+        if self._page is None:
+            data: Dict[str, Any] = await self._get_data()
+            self._page = await select_reminders_by_ids(
+                connector=self.database,
+                user_id=self.user_id,
+                reminder_ids=data["reminder_ids"],
+            )
+        return self._page
+
+    async def _set_page(self, page: List[Record], pos_first_elem: int, **fields):
+        self._page = page
+        await self._update(
+            pos_first_elem=pos_first_elem, **get_page_cursor(page), **fields
+        )
+
+    async def _update(self, **fields):
+        data: Dict[str, Any] = await self._get_data()
+        data.update(fields)
+        await self.state.update_data(**fields)
@@ -0,0 +1,63 @@
+"""
+Модуль с периодическим логированием статистики бота: состояние очереди
+доставки, попадания в кэш лимитов пользователей, состояние пула подключений,
+уведомления об изменении заметок, размер хранилища состояний FSM и время
+выполнения запросов к бд.
+"""
+
+import logging
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from asyncpg.pool import Pool
+
+from database import UserLimitsCacheClass, pool_metrics, query_registry
+from utils import BoundedMemoryStorage
+
+from .delivery import RemindersDelivery
+from .reminders_listener import RemindersListener
+
+
+def plan_interval_log_stats(
+    scheduler: AsyncIOScheduler,
+    pool: Pool,
+    delivery: Optional[RemindersDelivery],
+    user_limits: UserLimitsCacheClass,
+    listener: Optional[RemindersListener],
+    fsm_storage: Optional[BoundedMemoryStorage],
+):
+    scheduler.add_job(
+        _log_stats,
+        trigger="interval",
+        id="log_stats",
+        minutes=1,
+        kwargs={
+            "pool": pool,
+            "delivery": delivery,
+            "user_limits": user_limits,
+            "listener": listener,
+            "fsm_storage": fsm_storage,
+        },
+    )
+
+
+# Периодически пишем в лог состояние очереди доставки, попадания в кэш
+# лимитов пользователей, состояние пула, уведомления, хранилище FSM и время
+# запросов. delivery и listener - None, если процесс не отправляет
+# напоминания, fsm_storage - если процесс не обрабатывает апдейты
+async def _log_stats(
+    pool: Pool,
+    delivery: Optional[RemindersDelivery],
+    user_limits: UserLimitsCacheClass,
+    listener: Optional[RemindersListener],
+    fsm_storage: Optional[BoundedMemoryStorage],
+):
+    if delivery is not None:
+        logging.info("Delivery stats: %s", delivery.stats())
+    logging.info("User limits cache stats: %s", user_limits.stats())
+    if listener is not None:
+        logging.info("Reminders listener stats: %s", listener.stats())
+    if fsm_storage is not None:
+        logging.info("FSM storage stats: %s", fsm_storage.stats())
+    logging.info("Pool stats: %s", pool_metrics.stats(pool))
+    logging.info("Query timings: %s", query_registry.timings())
@@ -0,0 +1,93 @@
+"""
+Модуль со сбросом кэша лимитов пользователей по уведомлениям из бд.
+
+Счетчик заметок пользователя меняется не только в процессе, который
+обрабатывает апдейты: процессы отправки удаляют отправленные заметки
+и секции прошедших дней. Триггер из миграции 8 на каждое изменение
+премиум-статуса или счетчика отправляет в канал user_limits_changed
+id пользователя, и запись этого пользователя удаляется из кэша
+(при следующем обращении она загрузится из бд).
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from asyncpg import Connection
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from database import UserLimitsCacheClass
+
+# Канал уведомлений (см. функцию users_notify_limits_change в миграции 8)
+USER_LIMITS_CHANNEL: str = "user_limits_changed"
+# Пауза перед повторным подключением после потери соединения (в секундах)
+RECONNECT_DELAY: float = 5.0
+
+
+class UserLimitsListener:
+    def __init__(self, pool: Pool, user_limits: UserLimitsCacheClass):
+        self.pool: Pool = pool
+        self.user_limits: UserLimitsCacheClass = user_limits
+
+        # Подключение, на котором выполнен LISTEN (занято все время работы)
+        self._connection: Optional[PoolConnectionProxy] = None
+        self._reconnecting: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._listen()
+
+    async def stop(self):
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            await asyncio.gather(self._reconnecting, return_exceptions=True)
+            self._reconnecting = None
+        await self._release()
+
+    async def _listen(self):
+        connection: PoolConnectionProxy = await self.pool.acquire()
+        try:
+            await connection.add_listener(USER_LIMITS_CHANNEL, self._on_notification)
+        except Exception:
+            await self.pool.release(connection)
+            raise
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+
+    async def _release(self):
+        connection: Optional[PoolConnectionProxy] = self._connection
+        self._connection = None
+        if connection is None:
+            return
+
+        try:
+            connection.remove_termination_listener(self._on_termination)
+            await connection.remove_listener(USER_LIMITS_CHANNEL, self._on_notification)
+        except Exception:
+            logging.debug("User limits listener connection is already closed")
+        await self.pool.release(connection)
+
+    def _on_notification(
+        self, connection: Connection, pid: int, channel: str, payload: str
+    ):
+        self.user_limits.invalidate(int(payload))
+
+    # Соединение потеряно: пока переподключаемся, уведомления не приходят,
+    # поэтому после переподключения сбросим весь кэш
+    def _on_termination(self, connection: Connection):
+        logging.warning("User limits listener connection lost, reconnecting")
+        if self._reconnecting is None or self._reconnecting.done():
+            self._reconnecting = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        await self._release()
+        while True:
+            try:
+                await self._listen()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Failed to listen for user limits changes")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+        self.user_limits.clear()
@@ -3,4 +3,5 @@
 работы бота, но по смыслу не попали ни в одну из предыдущих категорий
 """
 
+from .fsm_storage import BoundedMemoryStorage, DurableMemoryStorage
 from .utils import assemble_full_reminder_text
@@ -0,0 +1,377 @@
+"""
+Модуль с хранилищем состояний FSM в оперативной памяти, ограниченным
+по времени жизни и количеству сессий.
+
+MemoryStorage из aiogram держит запись каждого пользователя, который писал
+боту, до перезапуска: запись создается даже при чтении состояния, а сценарий,
+брошенный на середине (например, ввод даты новой заметки), не удаляется
+никогда. BoundedMemoryStorage не хранит пустые сессии, забывает сессии,
+к которым не обращались дольше ttl секунд, и вытесняет давно не
+использованные сессии, если их больше max_size. Просроченные сессии
+удаляются при обращении к ним и периодической очисткой
+(см. services/fsm_sessions.py).
+
+DurableMemoryStorage дополнительно сохраняет сессии в таблицу fsm_sessions
+(миграция 7), чтобы начатые диалоги переживали перезапуск бота. Чтение
+по-прежнему идет только из памяти (все сессии загружаются при запуске),
+а изменения копятся и записываются в бд пачками раз в flush_interval секунд:
+несколько изменений одной сессии записываются одним (последним) состоянием.
+"""
+
+import asyncio
+import logging
+import pickle
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from asyncpg import Record
+from asyncpg.pool import Pool
+
+from database import (
+    DataBaseClass,
+    delete_expired_fsm_sessions,
+    delete_fsm_sessions,
+    load_fsm_sessions,
+    save_fsm_sessions,
+)
+
+# Максимальное количество сессий в памяти
+MAX_SESSIONS: int = 50000
+# Время жизни сессии без обращений (в секундах)
+SESSION_TTL: float = 3 * 60 * 60
+# Как часто записываем изменения сессий в бд (в секундах)
+FLUSH_INTERVAL: float = 1.0
+# Сколько изменений должно накопиться, чтобы записать их, не дожидаясь таймера
+BATCH_SIZE: int = 500
+
+
+@dataclass
+class _Session:
+    expires_at: float
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    # Оценка памяти, которую занимают state и data (в байтах)
+    size: int = 0
+
+
+# Грубая оценка памяти, которую занимает значение (вместе с вложенными
+# контейнерами)
+def _estimate_size(value: Any) -> int:
+    size: int = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            _estimate_size(key) + _estimate_size(item) for key, item in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+def _session_size(session: _Session) -> int:
+    return _estimate_size(session.state) + _estimate_size(session.data)
+
+
+class BoundedMemoryStorage(BaseStorage):
+    def __init__(self, max_size: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+
+        # Сессии в порядке последнего обращения: время жизни отсчитывается
+        # от последнего обращения, поэтому первые сессии и истекают первыми
+        self._sessions: OrderedDict[StorageKey, _Session] = OrderedDict()
+        self._bytes: int = 0
+
+        # Статистика
+        self._expired: int = 0
+        self._evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        state_name: Optional[str] = state.state if isinstance(state, State) else state
+        session: Optional[_Session] = self._touch(key, create=state_name is not None)
+        if session is None:
+            return
+        session.state = state_name
+        self._resize(key, session)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        session: Optional[_Session] = self._touch(key)
+        return session.state if session is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        session: Optional[_Session] = self._touch(key, create=bool(data))
+        if session is None:
+            return
+        session.data = dict(data)
+        self._resize(key, session)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        session: Optional[_Session] = self._touch(key)
+        return session.data.copy() if session is not None else {}
+
+    async def close(self):
+        self._sessions.clear()
+        self._bytes = 0
+
+    # Удаляем сессии, к которым не обращались дольше ttl. Возвращает
+    # количество удаленных сессий
+    def sweep(self) -> int:
+        now: float = time.monotonic()
+        expired: int = 0
+        while self._sessions:
+            key: StorageKey = next(iter(self._sessions))
+            if self._sessions[key].expires_at > now:
+                break
+            self._remove(key)
+            expired += 1
+
+        self._expired += expired
+        return expired
+
+    # Количество сессий, оценка занимаемой ими памяти и статистика удалений
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes_estimated": self._bytes,
+            "expired": self._expired,
+            "evictions": self._evictions,
+        }
+
+    # Находим сессию (или создаем, если create) и продлеваем ее. Просроченная
+    # сессия считается отсутствующей
+    def _touch(self, key: StorageKey, create: bool = False) -> Optional[_Session]:
+        now: float = time.monotonic()
+        session: Optional[_Session] = self._sessions.get(key)
+        if session is not None and session.expires_at <= now:
+            self._remove(key)
+            self._expired += 1
+            session = None
+
+        if session is None:
+            if not create:
+                return None
+            session = _Session(expires_at=now + self.ttl)
+            self._sessions[key] = session
+            self._evict()
+        else:
+            session.expires_at = now + self.ttl
+            self._sessions.move_to_end(key)
+        return session
+
+    # Пересчитываем размер сессии после изменения. Пустая сессия (после
+    # state.clear()) не хранится
+    def _resize(self, key: StorageKey, session: _Session):
+        if session.state is None and not session.data:
+            self._remove(key)
+            return
+
+        size: int = _session_size(session)
+        self._bytes += size - session.size
+        session.size = size
+        self._on_change(key)
+
+    def _remove(self, key: StorageKey):
+        session: _Session = self._sessions.pop(key)
+        self._bytes -= session.size
+        self._on_change(key)
+
+    # Сессия изменилась или удалена (для хранилищ, которые сохраняют сессии)
+    def _on_change(self, key: StorageKey):
+        pass
+
+    # Вытесняем давно не использованные сессии
+    def _evict(self):
+        while len(self._sessions) > self.max_size:
+            self._remove(next(iter(self._sessions)))
+            self._evictions += 1
+
+
+# Строковый ключ сессии в таблице fsm_sessions
+def _build_storage_key(key: StorageKey) -> str:
+    return ":".join(
+        "" if part is None else str(part)
+        for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id,
+            key.business_connection_id,
+            key.destiny,
+        )
+    )
+
+
+class DurableMemoryStorage(BoundedMemoryStorage):
+    def __init__(
+        self,
+        pool: Pool,
+        max_size: int = MAX_SESSIONS,
+        ttl: float = SESSION_TTL,
+        flush_interval: float = FLUSH_INTERVAL,
+        batch_size: int = BATCH_SIZE,
+    ):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.pool: Pool = pool
+        self.flush_interval: float = flush_interval
+        self.batch_size: int = batch_size
+
+        # Ключи сессий, изменения которых еще не записаны в бд. При записи
+        # берется текущее состояние сессии (нет в памяти - удаляется из бд)
+        self._dirty: Set[StorageKey] = set()
+        self._flush_needed: asyncio.Event = asyncio.Event()
+        self._flush_lock: asyncio.Lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+        # Статистика
+        self._restored: int = 0
+        self._saved: int = 0
+
+    # Удаляем из бд просроченные сессии, загружаем остальные в память
+    # и запускаем периодическую запись изменений (нужен запущенный event loop)
+    async def start(self):
+        now: datetime = datetime.now()
+        async with DataBaseClass(self.pool).acquire() as database:
+            expired: int = await delete_expired_fsm_sessions(
+                database, now - timedelta(seconds=self.ttl)
+            )
+            rows: List[Record] = await load_fsm_sessions(
+                database, now - timedelta(seconds=self.ttl), self.max_size
+            )
+            # Сессии, которые не поместились в память, больше не нужны
+            if rows and len(rows) >= self.max_size:
+                expired += await delete_expired_fsm_sessions(
+                    database, rows[-1]["updated_at"]
+                )
+
+        # Загружаем от старых к новым, чтобы сохранить порядок вытеснения
+        for row in reversed(rows):
+            try:
+                self._restore(row, now)
+            except Exception:
+                logging.exception(
+                    "Failed to restore FSM session %s", row["storage_key"]
+                )
+        logging.info("Restored %d FSM sessions, %d expired deleted", len(rows), expired)
+
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    # Останавливаем периодическую запись и записываем все, что накопилось
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        try:
+            await self.flush()
+        finally:
+            await super().close()
+
+    # Записываем в бд все накопившиеся изменения сессий
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            keys: List[StorageKey] = list(self._dirty)
+            self._dirty.clear()
+
+            now: datetime = datetime.now()
+            sessions: List[Dict[str, Any]] = []
+            deleted: List[str] = []
+            for key in keys:
+                session: Optional[_Session] = self._sessions.get(key)
+                if session is None:
+                    deleted.append(_build_storage_key(key))
+                    continue
+                try:
+                    sessions.append(self._dump(key, session, now))
+                except Exception:
+                    logging.exception("Failed to serialize FSM session %s", key)
+
+            try:
+                async with DataBaseClass(self.pool).acquire() as database:
+                    await save_fsm_sessions(database, sessions)
+                    await delete_fsm_sessions(database, deleted)
+            except Exception:
+                # Запишем эти сессии при следующей попытке (в их состоянии
+                # на тот момент)
+                self._dirty.update(keys)
+                raise
+            self._saved += len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "restored": self._restored,
+            "saved": self._saved,
+            "unsaved": len(self._dirty),
+        }
+
+    def _on_change(self, key: StorageKey):
+        self._dirty.add(key)
+        if len(self._dirty) >= self.batch_size:
+            self._flush_needed.set()
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Failed to save %d FSM sessions", len(self._dirty))
+
+    @staticmethod
+    def _dump(key: StorageKey, session: _Session, now: datetime) -> Dict[str, Any]:
+        return {
+            "storage_key": _build_storage_key(key),
+            "bot_id": key.bot_id,
+            "chat_id": key.chat_id,
+            "user_id": key.user_id,
+            "thread_id": key.thread_id,
+            "business_connection_id": key.business_connection_id,
+            "destiny": key.destiny,
+            "state": session.state,
+            "data": pickle.dumps(session.data),
+            "updated_at": now,
+        }
+
+    # Восстанавливаем сессию из бд. Время жизни отсчитывается от последнего
+    # изменения сессии (обращения без изменений в бд не попадают)
+    def _restore(self, row: Record, now: datetime):
+        key: StorageKey = StorageKey(
+            bot_id=row["bot_id"],
+            chat_id=row["chat_id"],
+            user_id=row["user_id"],
+            thread_id=row["thread_id"],
+            business_connection_id=row["business_connection_id"],
+            destiny=row["destiny"],
+        )
+        age: float = (now - row["updated_at"]).total_seconds()
+        session: _Session = _Session(
+            expires_at=time.monotonic() + self.ttl - age,
+            state=row["state"],
+            data=pickle.loads(row["data"]),
+        )
+        session.size = _session_size(session)
+
+        self._sessions[key] = session
+        self._bytes += session.size
+        self._restored += 1